@@ -1,9 +1,15 @@
 import streamlit as st
-from few_shot import FewShotPosts
-from post_generator import generate_post
-import time
+from engagement_model import get_engagement_model
+from few_shot import get_few_shot
+from llm_helper import base_llm
+from near_dup import find_near_duplicates
+from metrics import inc, registry
+from post_generator import generate_post_stream
+from post_store import PostStore
+from warm_pool import WarmPool
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
-import json
 import os
 
 # Constants
@@ -11,41 +17,173 @@ LENGTH_OPTIONS = ["Short", "Medium", "Long"]
 LANGUAGE_OPTIONS = ["English", "Hinglish", "Hindi", "Marathi"]
 TONE_OPTIONS = ["Professional", "Casual", "Inspirational", "Humorous", "Opinionated"]
 SAVE_FOLDER = "saved_posts"
+MAX_PARALLEL_VARIANTS = int(os.getenv("MAX_PARALLEL_VARIANTS", "5"))
+HISTORY_PAGE_SIZE = 20
+MAX_VARIANT_REGENERATIONS = int(os.getenv("MAX_VARIANT_REGENERATIONS", "2"))
 
 # Create save directory if it doesn't exist
 if not os.path.exists(SAVE_FOLDER):
     os.makedirs(SAVE_FOLDER)
 
+@st.cache_resource
+def get_post_store():
+    """Shared saved-post store; imports the legacy JSON files on first use"""
+    store = PostStore(os.path.join(SAVE_FOLDER, "posts.sqlite3"))
+    store.migrate_json_dir(SAVE_FOLDER)
+    return store
+
 def save_post(post_data):
-    """Save generated post to a JSON file"""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{SAVE_FOLDER}/post_{timestamp}.json"
-    
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(post_data, f, ensure_ascii=False, indent=4)
-    
-    return filename
-
-
-def delete_post(filename):
-    """Delete a saved post file by filename"""
-    file_path = os.path.join(SAVE_FOLDER, filename)
-    if os.path.exists(file_path):
-        os.remove(file_path)
-
-def load_saved_posts():
-    """Load all saved posts from the save directory"""
-    posts = []
-    for filename in os.listdir(SAVE_FOLDER):
-        if filename.endswith(".json"):
-            with open(os.path.join(SAVE_FOLDER, filename), "r", encoding="utf-8") as f:
-                try:
-                    post_data = json.load(f)
-                    post_data["filename"] = filename
-                    posts.append(post_data)
-                except json.JSONDecodeError:
-                    continue
-    return sorted(posts, key=lambda x: x.get("timestamp", ""), reverse=True)
+    """Save generated post to the post store and return its id"""
+    return get_post_store().save(post_data)
+
+
+def delete_post(post_id):
+    """Delete a saved post by id"""
+    get_post_store().delete(post_id)
+
+@st.cache_resource
+def get_variant_pool():
+    """Bounded thread pool shared by all sessions for variant generation"""
+    return ThreadPoolExecutor(max_workers=MAX_PARALLEL_VARIANTS, thread_name_prefix="variant")
+
+@st.cache_resource
+def get_warm_pool():
+    """Pre-generated fresh variants for the most requested settings, shared by all sessions"""
+    return WarmPool(pregenerate_variant)
+
+def pregenerate_variant(key):
+    stats = {}
+    text = "".join(generate_post_stream(*key, fresh=True, stats=stats))
+    return None if stats.get("error") else (text, stats)
+
+def stream_variant(buffers, i, cancelled, length, language, tag, tone, fresh):
+    """Stream one variant into buffers[i] and return its generation stats.
+
+    Fresh variants come from the warm pool when one is ready.
+    """
+    if fresh:
+        pooled = get_warm_pool().take((length, language, tag, tone))
+        if pooled is not None:
+            buffers[i] = pooled[0]
+            return dict(pooled[1], pooled=True)
+    stats = {}
+    stream = generate_post_stream(length, language, tag, tone, fresh=fresh, stats=stats)
+    try:
+        for text in stream:
+            if cancelled.is_set():
+                break
+            buffers[i] += text
+    finally:
+        stream.close()
+    return stats
+
+def generate_variants(num_variants, length, language, tag, tone):
+    """Generate variants concurrently, rendering each one's tokens live.
+
+    Streamlit interrupts the script when the user changes a setting; the
+    redraw on every poll gives it that chance, and the finally block
+    cancels variants that have not started and stops the running streams.
+    Variants that nearly repeat an earlier one are regenerated, up to
+    MAX_VARIANT_REGENERATIONS rounds.
+    """
+    pool = get_variant_pool()
+    buffers = [""] * num_variants
+    cancelled = threading.Event()
+    futures = {
+        pool.submit(stream_variant, buffers, i, cancelled, length, language, tag, tone, i > 0): i
+        for i in range(num_variants)
+    }
+    placeholders = []
+    for i in range(num_variants):
+        with st.expander(f"Variant {i + 1}", expanded=True):
+            placeholder = st.empty()
+            placeholder.info("Generating...")
+            placeholders.append(placeholder)
+    progress = st.progress(0.0, text=f"0/{num_variants} variants ready")
+
+    stats = [None] * num_variants
+    shown = [""] * num_variants
+    pending = set(futures)
+    regenerations = 0
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = futures[future]
+                stats[i] = future.result()
+                source = "Pre-generated" if stats[i].get("pooled") else "Generated"
+                placeholders[i].markdown(
+                    f"{buffers[i]}\n\n*{source} in {stats[i]['total_time']:.2f}s · "
+                    f"first token {stats[i]['ttft'] or 0:.2f}s · {stats[i]['completion_tokens']} tokens*"
+                )
+            for future in pending:
+                i = futures[future]
+                if buffers[i] != shown[i]:
+                    shown[i] = buffers[i]
+                    placeholders[i].markdown(shown[i] + "▌")
+            if not pending and regenerations < MAX_VARIANT_REGENERATIONS:
+                duplicates = find_near_duplicates(buffers)
+                inc("variant_regenerations_total", len(duplicates))
+                for i in duplicates:
+                    buffers[i] = shown[i] = ""
+                    placeholders[i].info("Too similar to another variant, regenerating...")
+                    future = pool.submit(stream_variant, buffers, i, cancelled, length, language, tag, tone, True)
+                    futures[future] = i
+                    pending.add(future)
+                regenerations += 1
+            ready = num_variants - len(pending)
+            progress.progress(ready / num_variants, text=f"{ready}/{num_variants} variants ready")
+    finally:
+        cancelled.set()
+        for future in pending:
+            future.cancel()
+    return buffers, stats
+
+def render_debug_panel():
+    """Recent hot-path percentiles, counters and LLM backend health"""
+    snapshot = registry.snapshot()
+    rows = []
+    for histogram in snapshot["histograms"]:
+        labels = ", ".join(f"{key}={value}" for key, value in histogram["labels"].items())
+        seconds = histogram["name"].endswith("_seconds")
+        scale = 1000 if seconds else 1
+        rows.append({
+            "metric": f"{histogram['name']} ({labels})" if labels else histogram["name"],
+            "count": histogram["count"],
+            "p50": round(histogram["p50"] * scale, 1),
+            "p95": round(histogram["p95"] * scale, 1),
+            "p99": round(histogram["p99"] * scale, 1),
+            "unit": "ms" if seconds else "tokens",
+        })
+    if rows:
+        st.dataframe(rows, hide_index=True)
+    else:
+        st.caption("No calls recorded yet")
+    st.dataframe(base_llm.health(), hide_index=True)
+    col_hits, col_retries, col_parse = st.columns(3)
+    col_hits.metric("Cache hit rate", f"{snapshot['cache_hit_rate']:.0%}")
+    col_retries.metric("Retries", registry.counter_value("retries_total"))
+    col_parse.metric("Parse failures", registry.counter_value("parse_failures_total"))
+    col_pool, col_coalesced = st.columns(2)
+    col_pool.metric("Warm pool hits", registry.counter_value("warm_pool_lookups_total", result="hit"))
+    col_coalesced.metric("Coalesced requests", registry.counter_value("coalesced_requests_total"))
+    col_prom, col_json = st.columns(2)
+    with col_prom:
+        st.download_button("Prometheus", data=registry.to_prometheus(), file_name="metrics.prom", mime="text/plain")
+    with col_json:
+        st.download_button("JSON", data=registry.to_json(), file_name="metrics.json", mime="application/json")
+
+def rank_variants(posts, stats, language, tag):
+    """Score all variants in one batch and order them by predicted engagement, best first"""
+    scores = get_engagement_model().predict(posts, [{"language": language, "tags": [tag]}] * len(posts))
+    for variant_stats, score in zip(stats, scores):
+        variant_stats["predicted_engagement"] = int(round(score))
+    order = sorted(range(len(posts)), key=lambda i: -scores[i])
+    return [posts[i] for i in order], [stats[i] for i in order]
+
+def load_saved_posts(page=0, tag=None):
+    """Load one page of saved posts, newest first"""
+    return get_post_store().list_posts(limit=HISTORY_PAGE_SIZE, offset=page * HISTORY_PAGE_SIZE, tag=tag)
 
 def main():
     # Initialize session state
@@ -53,6 +191,10 @@ def main():
         st.session_state.generated_posts = []
     if "selected_post" not in st.session_state:
         st.session_state.selected_post = None
+    if "generation_stats" not in st.session_state:
+        st.session_state.generation_stats = []
+    if "history_page" not in st.session_state:
+        st.session_state.history_page = 0
     
     # App title and description
     st.title("🚀 Social Media Post Generator Pro")
@@ -64,20 +206,41 @@ def main():
     with st.sidebar:
         st.header("Settings")
         dark_mode = st.toggle("Dark Mode", value=False)
+        with st.expander("Debug metrics"):
+            render_debug_panel()
 
         st.header("Post History")
-        saved_posts = load_saved_posts()
+        store = get_post_store()
+        history_tags = store.tags()
+        history_tag = st.selectbox("Filter by topic", options=["All"] + history_tags, key="history_tag")
+        history_tag = None if history_tag == "All" else history_tag
+        total_saved = store.count(history_tag)
+        last_page = max(0, (total_saved - 1) // HISTORY_PAGE_SIZE)
+        page = min(st.session_state.history_page, last_page)
+        saved_posts = load_saved_posts(page, history_tag)
         if saved_posts:
             for post in saved_posts:
                 col_hist, col_del = st.columns([4,1])
                 with col_hist:
-                    if st.button(f"{post.get('tag', 'Untitled')} - {post.get('timestamp', 'No date')}", key=f"hist_{post['filename']}"):
+                    if st.button(f"{post.get('tag', 'Untitled')} - {post.get('timestamp', 'No date')}", key=f"hist_{post['id']}"):
                         st.session_state.selected_post = post
                 with col_del:
-                    if st.button("🗑️", key=f"del_{post['filename']}"):
-                        delete_post(post['filename'])
+                    if st.button("🗑️", key=f"del_{post['id']}"):
+                        delete_post(post['id'])
                         st.rerun()
                         return
+            if last_page > 0:
+                col_newer, col_page, col_older = st.columns([1,2,1])
+                with col_newer:
+                    if st.button("◀", key="history_newer", disabled=page == 0):
+                        st.session_state.history_page = page - 1
+                        st.rerun()
+                with col_page:
+                    st.caption(f"Page {page + 1} of {last_page + 1} ({total_saved} posts)")
+                with col_older:
+                    if st.button("▶", key="history_older", disabled=page >= last_page):
+                        st.session_state.history_page = page + 1
+                        st.rerun()
         else:
             st.info("No saved posts yet")
     
@@ -87,7 +250,7 @@ def main():
     with tab1:
         # Settings columns
         col1, col2, col3 = st.columns(3)
-        fs = FewShotPosts()
+        fs = get_few_shot()
         
         with col1:
             selected_tag = st.selectbox(
@@ -133,41 +296,61 @@ def main():
         
         # Generate button with loading state
         if st.button("✨ Generate Posts", type="primary"):
-            with st.spinner(f"Generating {num_variants} post variants..."):
-                start_time = time.time()
-                
-                generated_posts = []
-                for i in range(num_variants):
-                    post = generate_post(
-                        selected_length, 
-                        selected_language, 
-                        selected_tag,
-                        selected_tone
-                    )
-                    generated_posts.append(post)
-                
-                st.session_state.generated_posts = generated_posts
-                generation_time = time.time() - start_time
-                
-                # Save the first post by default
-                post_data = {
-                    "text": generated_posts[0],
-                    "tag": selected_tag,
-                    "length": selected_length,
-                    "language": selected_language,
-                    "tone": selected_tone,
-                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "generation_time": f"{generation_time:.2f}s"
-                }
-                save_post(post_data)
-                
-                st.success(f"Generated {num_variants} posts in {generation_time:.2f} seconds!")
+            live = st.empty()
+            with live.container():
+                generated_posts, generation_stats = generate_variants(
+                    num_variants,
+                    selected_length, 
+                    selected_language, 
+                    selected_tag,
+                    selected_tone
+                )
+            live.empty()
+            generated_posts, generation_stats = rank_variants(
+                generated_posts, generation_stats, selected_language, selected_tag
+            )
+            
+            st.session_state.generated_posts = generated_posts
+            st.session_state.generation_stats = generation_stats
+            generation_times = [stats["total_time"] for stats in generation_stats]
+            
+            # Save the top-ranked post by default
+            post_data = {
+                "text": generated_posts[0],
+                "tag": selected_tag,
+                "length": selected_length,
+                "language": selected_language,
+                "tone": selected_tone,
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "generation_time": f"{generation_times[0]:.2f}s",
+                "time_to_first_token": f"{generation_stats[0]['ttft'] or 0:.2f}s",
+                "completion_tokens": generation_stats[0]["completion_tokens"],
+                "prompt_tokens": generation_stats[0].get("prompt_tokens", 0),
+                "predicted_engagement": generation_stats[0]["predicted_engagement"]
+            }
+            save_post(post_data)
+            
+            st.success(
+                f"Generated {num_variants} posts in {max(generation_times):.2f} seconds "
+                f"({min(generation_times):.2f}s fastest variant), ranked by predicted engagement!"
+            )
         
         # Display generated posts
         if st.session_state.generated_posts:
             st.subheader("Generated Posts")
+            generation_stats = st.session_state.generation_stats
             for i, post in enumerate(st.session_state.generated_posts, 1):
-                with st.expander(f"Variant {i}", expanded=i==1):
+                label = f"Variant {i}"
+                if i <= len(generation_stats):
+                    stats = generation_stats[i - 1]
+                    if "predicted_engagement" in stats:
+                        label += f" · ~{stats['predicted_engagement']} reactions"
+                    label += f" · {stats['total_time']:.2f}s · TTFT {stats['ttft'] or 0:.2f}s · {stats['completion_tokens']} tokens"
+                    if stats.get("prompt_tokens_saved"):
+                        label += f" · prompt {stats['prompt_tokens']} tokens ({stats['prompt_tokens_saved']} saved)"
+                    if stats.get("pooled"):
+                        label += " · pre-generated"
+                with st.expander(label, expanded=i==1):
                     st.markdown(post)
                     
                     # Post actions
@@ -228,11 +411,9 @@ def main():
             
             with col_analyze:
                 if st.button("Analyze Engagement"):
-                    with st.spinner("Predicting engagement..."):
-                        # Simulate engagement prediction
-                        time.sleep(1)
-                        engagement_score = min(int(len(edited_post) * 0.5 + 100), 1000)
-                        st.metric("Predicted Engagement", f"{engagement_score} reactions")
+                    meta = {"language": post_to_edit.get("language"), "tags": [post_to_edit.get("tag")]}
+                    engagement_score = get_engagement_model().predict([edited_post], [meta])[0]
+                    st.metric("Predicted Engagement", f"{engagement_score:.0f} reactions")
         else:
             st.info("Generate or select a post from history to edit")
 
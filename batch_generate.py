@@ -0,0 +1,230 @@
+"""Headless bulk post generation from a spec file.
+
+The spec is CSV or JSON/JSONL with one row per job: tag, length, language,
+tone and count. Every generated post is appended to a JSONL output as soon
+as it is ready; re-running with the same spec and output skips posts that
+are already there, so an interrupted run resumes where it stopped.
+
+Usage: python batch_generate.py spec.csv -o generated.jsonl [--workers 4] [--rpm 30] [--stub] [--metrics metrics.prom]
+"""
+import os
+import sys
+
+if "--stub" in sys.argv[1:]:
+    # Offline run: keep llm_helper importable without an API key
+    os.environ.setdefault("GROQ_API_KEY", "stub-offline")
+
+import argparse
+import csv
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from metrics import inc, write_metrics
+from near_dup import VARIANT_DUP_THRESHOLD, NearDuplicateIndex
+from post_generator import generate_post_text
+from post_io import append_record, iter_records
+from worker_pool import ThroughputReport, TokenBucket, call_with_retry
+
+DEFAULTS = {"length": "Medium", "language": "English", "tone": "Professional", "count": 1}
+MAX_VARIANT_REGENERATIONS = int(os.getenv("MAX_VARIANT_REGENERATIONS", "2"))
+
+
+def load_spec(spec_path):
+    """Read job rows from a CSV or JSON/JSONL spec file"""
+    if spec_path.endswith(".csv"):
+        with open(spec_path, "r", encoding="utf-8", newline="") as file:
+            rows = [
+                {key.strip(): (value or "").strip() for key, value in row.items() if key}
+                for row in csv.DictReader(file)
+            ]
+    else:
+        rows = list(iter_records(spec_path))
+
+    # Jobs are keyed on their settings, not their row, so editing or reordering the
+    # spec keeps the ids of finished posts; rows with the same settings add up
+    jobs = {}
+    for i, row in enumerate(rows):
+        if not row.get("tag"):
+            raise ValueError(f"Spec row {i + 1} has no tag")
+        job = {key: row.get(key) or default for key, default in DEFAULTS.items()}
+        job["tag"] = row["tag"]
+        job["count"] = int(job["count"])
+        job["id"] = f"{job['tag']}|{job['length']}|{job['language']}|{job['tone']}"
+        if job["id"] in jobs:
+            jobs[job["id"]]["count"] += job["count"]
+        else:
+            jobs[job["id"]] = job
+    return list(jobs.values())
+
+
+def load_done(output_path):
+    """(job id, variant) pairs already present in the output"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line of an interrupted run
+            done.add((record["job"], record["variant"]))
+    return done
+
+
+class BatchRunner:
+    """Concurrent job scheduler around post_generator.generate_post_text"""
+
+    def __init__(self, jobs, output_path, max_workers=4, requests_per_minute=30, retries=3, llm_client=None):
+        self.jobs = {job["id"]: job for job in jobs}
+        self.output_path = output_path
+        self.max_workers = max_workers
+        self.rate_limiter = TokenBucket.per_minute(requests_per_minute, capacity=max_workers)
+        self.retries = retries
+        self.llm_client = llm_client
+        self.reports = {job_id: ThroughputReport() for job_id in self.jobs}
+        self.errors = {job_id: [] for job_id in self.jobs}
+        # Variants of a job that nearly repeat an earlier one are generated again
+        self.variant_indexes = {job_id: NearDuplicateIndex(VARIANT_DUP_THRESHOLD) for job_id in self.jobs}
+        self.index_lock = threading.Lock()
+        self.regenerated = {job_id: 0 for job_id in self.jobs}
+        self.skipped = 0
+        self.write_lock = threading.Lock()
+
+    def units(self):
+        done = load_done(self.output_path)
+        for job_id, job in self.jobs.items():
+            for variant in range(job["count"]):
+                if (job_id, variant) in done:
+                    self.skipped += 1
+                else:
+                    yield job_id, variant
+
+    def run_unit(self, unit):
+        job_id, variant = unit
+        job = self.jobs[job_id]
+        report = self.reports[job_id]
+        started = time.perf_counter()
+        for attempt in range(MAX_VARIANT_REGENERATIONS + 1):
+            text = call_with_retry(
+                lambda _: generate_post_text(
+                    job["length"], job["language"], job["tag"], job["tone"],
+                    fresh=True, llm_client=self.llm_client,
+                ),
+                None, rate_limiter=self.rate_limiter, retries=self.retries, report=report,
+            )
+            with self.index_lock:
+                duplicate = self.variant_indexes[job_id].find_or_add(variant, text)
+            if duplicate is None or attempt == MAX_VARIANT_REGENERATIONS:
+                break
+            inc("variant_regenerations_total")
+            with self.index_lock:
+                self.regenerated[job_id] += 1
+        record = {
+            "job": job_id,
+            "variant": variant,
+            "tag": job["tag"],
+            "length": job["length"],
+            "language": job["language"],
+            "tone": job["tone"],
+            "text": text,
+            "latency": round(time.perf_counter() - started, 3),
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        with self.write_lock:
+            append_record(self.output_file, record)
+
+    def run(self):
+        """Generate every missing post; returns the per-job stats"""
+        for report in self.reports.values():
+            report.start()
+        units = self.units()
+        pending = {}
+        with open(self.output_path, "a", encoding="utf-8") as self.output_file, \
+                ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                # Keep a bounded number of units in flight
+                while len(pending) < self.max_workers * 2:
+                    unit = next(units, None)
+                    if unit is None:
+                        break
+                    pending[executor.submit(self.run_unit, unit)] = unit
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id, variant = pending.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        self.errors[job_id].append(f"variant {variant}: {error}")
+        for report in self.reports.values():
+            report.stop()
+        return self.stats()
+
+    def stats(self):
+        jobs = {}
+        for job_id, report in self.reports.items():
+            summary = report.summary()
+            # Discarded near-duplicates were generated but not written
+            summary["regenerated"] = self.regenerated[job_id]
+            summary["items"] -= summary["regenerated"]
+            summary["items_per_sec"] = summary["items"] / summary["elapsed"] if summary["elapsed"] > 0 else 0.0
+            summary["errors"] = self.errors[job_id]
+            jobs[job_id] = summary
+        generated = sum(job["items"] for job in jobs.values())
+        return {
+            "generated": generated,
+            "skipped": self.skipped,
+            "errors": sum(len(errors) for errors in self.errors.values()),
+            "jobs": jobs,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("spec", help="CSV or JSON/JSONL file with tag, length, language, tone, count")
+    parser.add_argument("-o", "--output", default="generated_posts.jsonl")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("LLM_MAX_CONCURRENCY", "4")))
+    parser.add_argument("--rpm", type=float, default=float(os.getenv("LLM_REQUESTS_PER_MINUTE", "30")),
+                        help="Provider request quota per minute")
+    parser.add_argument("--retries", type=int, default=int(os.getenv("LLM_MAX_RETRIES", "3")))
+    parser.add_argument("--stats", help="Write run statistics as JSON to this file")
+    parser.add_argument("--metrics", help="Export hot-path metrics to this file (.prom for Prometheus text, else JSON)")
+    parser.add_argument("--stub", action="store_true", help="Use the offline stub LLM instead of the API")
+    parser.add_argument("--stub-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    llm_client = None
+    if args.stub:
+        from stub_llm import StubLLM
+        llm_client = StubLLM(latency=args.stub_latency)
+
+    runner = BatchRunner(
+        load_spec(args.spec), args.output,
+        max_workers=args.workers, requests_per_minute=args.rpm,
+        retries=args.retries, llm_client=llm_client,
+    )
+    stats = runner.run()
+
+    for job_id, job in stats["jobs"].items():
+        print(
+            f"{job_id}: {job['items']} generated, {job['regenerated']} near-duplicates regenerated, "
+            f"{len(job['errors'])} errors, "
+            f"{job['items_per_sec']:.2f} posts/s, p50 {job['p50_latency']:.2f}s, p95 {job['p95_latency']:.2f}s"
+        )
+        for error in job["errors"][:3]:
+            print(f"    {error}")
+    print(f"Total: {stats['generated']} generated, {stats['skipped']} already done, {stats['errors']} errors")
+
+    if args.stats:
+        with open(args.stats, "w", encoding="utf-8") as file:
+            json.dump(stats, file, indent=4)
+    if args.metrics:
+        write_metrics(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""Deterministic benchmark suite for the app's own overhead, with a fake LLM backend.
+
+Measures corpus loading, few-shot lookup and retrieval, prompt building,
+response post-processing, engagement scoring, the preprocessing pipeline and saved-post history
+on seeded synthetic corpora, so LLM latency never enters the numbers.
+
+Usage: python benchmark.py [--sizes 1000 100000 1000000] [--benches load lookup ...]
+                           [--json results.json] [--baseline old.json --tolerance 0.25]
+"""
+import os
+
+# The suite never calls the real API; keep llm_helper importable without a key
+os.environ.setdefault("GROQ_API_KEY", "benchmark-offline")
+os.environ.setdefault("LLM_CACHE_ENABLED", "0")
+
+import argparse
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+
+from engagement_model import EngagementModel
+from few_shot import FewShotPosts
+from post_generator import ThinkStripper, build_prompt, extract_post_content
+from post_io import write_records
+from post_store import PostStore
+from preprocess import process_post
+from stub_llm import StubLLM
+from worker_pool import percentile
+
+TAGS = [
+    "Job Search", "Mental Health", "Motivation", "Scams", "Career Advice", "Productivity",
+    "Self Improvement", "Leadership", "Networking", "Work-Life Balance", "Interview Tips",
+    "Remote Work", "Entrepreneurship", "Personal Branding", "Upskilling", "Layoffs",
+]
+LANGUAGES = ["English", "Hinglish"]
+LENGTHS = ["Short", "Medium", "Long"]
+TONES = ["Professional", "Casual", "Inspirational", "Humorous", "Opinionated"]
+WORDS = (
+    "job career growth team learning interview resume hiring manager skills network mindset "
+    "office remote work life balance success failure journey lesson weekend deadline meeting "
+    "startup founder salary offer linkedin recruiter feedback mentor goal habit focus"
+).split()
+
+# Pipeline and history benches are capped; they measure per-item overhead
+PIPELINE_MAX_POSTS = 20_000
+HISTORY_MAX_POSTS = 100_000
+
+
+def synthetic_posts(count, seed=42):
+    """Yield `count` deterministic fake processed posts"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        line_count = rng.randint(1, 15)
+        lines = [" ".join(rng.choices(WORDS, k=rng.randint(4, 12))) for _ in range(line_count)]
+        yield {
+            "text": "\n".join(lines),
+            "engagement": rng.randint(10, 2000),
+            "line_count": line_count,
+            "language": rng.choice(LANGUAGES),
+            "tags": rng.sample(TAGS, 2),
+        }
+
+
+def fake_completion(rng):
+    """A reasoning-model style completion with a <think> block"""
+    reasoning = " ".join(rng.choices(WORDS, k=120))
+    post = "\n".join(" ".join(rng.choices(WORDS, k=10)) for _ in range(8))
+    return f"<think>{reasoning}</think>\n\n{post}\n#Career"
+
+
+def scan_filtered_posts(df, length, language, tag, limit=3):
+    """Baseline: the full-column mask scan get_filtered_posts used before indexing"""
+    df_filtered = df[
+        (df["length"] == length) &
+        (df["language"] == language) &
+        (df["tags"].apply(lambda x: tag in x if isinstance(x, list) else False))
+    ]
+    return df_filtered.head(limit).to_dict(orient='records')
+
+
+def time_calls(func, calls):
+    """Latency summary (microseconds) of func(*args) over the given argument tuples"""
+    latencies = []
+    for args in calls:
+        started = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - started)
+    return {
+        "mean_us": sum(latencies) / len(latencies) * 1e6,
+        "p50_us": percentile(latencies, 50) * 1e6,
+        "p95_us": percentile(latencies, 95) * 1e6,
+    }
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+class Suite:
+    """Runs the benches for one corpus size inside a scratch directory"""
+
+    def __init__(self, size, tmp, lookups=2000, scan_lookups=20, llm_latency=0.0, seed=42):
+        self.size = size
+        self.tmp = tmp
+        self.lookups = lookups
+        self.scan_lookups = scan_lookups
+        self.llm_latency = llm_latency
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.corpus_path = os.path.join(tmp, f"posts_{size}.jsonl")
+        self.corpus = None
+
+    def queries(self, count):
+        return [
+            (self.rng.choice(LENGTHS), self.rng.choice(LANGUAGES), self.rng.choice(TAGS), self.rng.choice(TONES))
+            for _ in range(count)
+        ]
+
+    def bench_load(self):
+        write_records(self.corpus_path, synthetic_posts(self.size, self.seed))
+        _, cold = timed(lambda: FewShotPosts(self.corpus_path, use_snapshot=False))
+        _, first = timed(lambda: FewShotPosts(self.corpus_path))
+        self.corpus, snapshot = timed(lambda: FewShotPosts(self.corpus_path))
+        return {"cold_s": cold, "cold_with_snapshot_write_s": first, "snapshot_s": snapshot}
+
+    def bench_lookup(self):
+        queries = self.queries(self.lookups)
+        result = {
+            "index": time_calls(self.corpus.get_filtered_posts, [q[:3] for q in queries]),
+            "similar": time_calls(self.corpus.get_similar_posts, queries[:200]),
+        }
+        if self.scan_lookups:
+            df = self.corpus.df
+            result["scan"] = time_calls(lambda *q: scan_filtered_posts(df, *q), [q[:3] for q in queries[:self.scan_lookups]])
+        return result
+
+    def bench_prompt(self):
+        return time_calls(lambda *q: build_prompt(*q, corpus=self.corpus), self.queries(200))
+
+    def bench_extract(self):
+        completions = [(fake_completion(self.rng),) for _ in range(500)]
+
+        def stream(text):
+            stripper = ThinkStripper()
+            for i in range(0, len(text), 4):
+                stripper.feed(text[i:i + 4])
+            stripper.flush()
+
+        return {
+            "extract_post_content": time_calls(extract_post_content, completions),
+            "think_stripper_stream": time_calls(stream, completions[:100]),
+        }
+
+    def bench_engagement(self):
+        posts = list(synthetic_posts(min(self.size, PIPELINE_MAX_POSTS), self.seed))
+        model, train = timed(lambda: EngagementModel().fit(posts))
+        variants = [[post["text"] for post in self.rng.sample(posts, 5)] for _ in range(200)]
+        metas = [{"language": "English", "tags": ["Job Search"]}] * 5
+        batch = time_calls(lambda texts: model.predict(texts, metas), [(texts,) for texts in variants])
+        return {
+            "posts": len(posts),
+            "train_s": train,
+            "predict_5_variants": batch,
+            "per_variant_us": batch["mean_us"] / 5,
+        }
+
+    def bench_pipeline(self):
+        count = min(self.size, PIPELINE_MAX_POSTS)
+        raw_path = os.path.join(self.tmp, f"raw_{count}.jsonl")
+        write_records(raw_path, (
+            {key: post[key] for key in ("text", "engagement")}
+            for post in synthetic_posts(count, self.seed)
+        ))
+        output_path = os.path.join(self.tmp, f"processed_{count}.jsonl")
+        llm_client = StubLLM(latency=self.llm_latency, seed=self.seed)
+        report, elapsed = timed(lambda: process_post(
+            raw_path, output_path, requests_per_minute=1e9, llm_client=llm_client, incremental=False,
+        ))
+        _, rerun = timed(lambda: process_post(raw_path, output_path, requests_per_minute=1e9, llm_client=llm_client))
+        return {
+            "posts": count,
+            "total_s": elapsed,
+            "posts_per_sec": count / elapsed if elapsed else 0.0,
+            "incremental_rerun_s": rerun,
+            "llm_calls": llm_client.calls,
+            "extraction": report.summary(),
+        }
+
+    def bench_history(self):
+        count = min(self.size, HISTORY_MAX_POSTS)
+        store = PostStore(os.path.join(self.tmp, f"history_{count}.sqlite3"))
+        posts = list(synthetic_posts(count, self.seed))
+        for i, post in enumerate(posts):
+            post["tag"] = post["tags"][0]
+            post["timestamp"] = f"2025-01-01 00:{i // 3600 % 60:02d}:{i % 60:02d}"
+        started = time.perf_counter()
+        for post in posts:
+            store.save(post)
+        insert = (time.perf_counter() - started) / count
+        pages = [(20, self.rng.randrange(0, max(1, count // 20)) * 20) for _ in range(100)]
+        return {
+            "posts": count,
+            "insert_us": insert * 1e6,
+            "page": time_calls(lambda limit, offset: store.list_posts(limit, offset), pages),
+            "first_page_by_tag": time_calls(lambda tag: store.list_posts(20, 0, tag), [(tag,) for tag in TAGS]),
+        }
+
+
+BENCHES = ["load", "lookup", "prompt", "extract", "engagement", "pipeline", "history"]
+
+
+def run(sizes, benches, **kwargs):
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            suite = Suite(size, tmp, **kwargs)
+            # lookup and prompt need the corpus loaded by the load bench
+            todo = benches if "load" in benches else ["load"] + list(benches)
+            for bench in todo:
+                result = getattr(suite, f"bench_{bench}")()
+                if bench in benches:
+                    results.append({"bench": bench, "size": size, **result})
+                    print(f"[{size}] {bench}: {json.dumps(result, default=float)}", file=sys.stderr)
+    return results
+
+
+def flatten(result, prefix=""):
+    """(name, value) pairs of the numeric leaves of a result dict"""
+    for key, value in result.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from flatten(value, name + ".")
+        elif isinstance(value, (int, float)) and (name.endswith("_s") or name.endswith("_us")):
+            yield name, value
+
+
+def compare(results, baseline, tolerance):
+    """Timings that got slower than the baseline by more than `tolerance`"""
+    old = {
+        (entry["bench"], entry["size"], name): value
+        for entry in baseline["results"] for name, value in flatten(entry)
+    }
+    regressions = []
+    for entry in results:
+        for name, value in flatten(entry):
+            before = old.get((entry["bench"], entry["size"], name))
+            if before and value > before * (1 + tolerance):
+                regressions.append(f"{entry['bench']}[{entry['size']}] {name}: {before:.4g} -> {value:.4g}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000])
+    parser.add_argument("--benches", nargs="+", choices=BENCHES, default=BENCHES)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--scan-lookups", type=int, default=20, help="0 skips the scanning baseline")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Fake LLM latency per call, seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Write results to this file (stdout if omitted)")
+    parser.add_argument("--baseline", help="Earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline")
+    args = parser.parse_args()
+
+    results = run(
+        args.sizes, args.benches,
+        lookups=args.lookups, scan_lookups=args.scan_lookups,
+        llm_latency=args.llm_latency, seed=args.seed,
+    )
+    output = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "seed": args.seed,
+            "llm_latency": args.llm_latency,
+        },
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(output, file, indent=4)
+    else:
+        print(json.dumps(output, indent=4))
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""Local engagement predictor trained on the processed corpus.
+
+A ridge regression on log engagement over hashed TF-IDF text features
+(the same vectorizer as few-shot retrieval) plus a few metadata columns.
+Training takes seconds on CPU, the model is persisted next to the corpus
+and scoring a batch of posts is a couple of small matrix products.
+
+Usage: python engagement_model.py [data/processed_posts.json]
+"""
+import os
+import re
+import sys
+import threading
+import zlib
+
+import numpy as np
+
+from few_shot import DEFAULT_POSTS_PATH, FewShotPosts, file_hash, file_signature
+from post_io import iter_records
+from vectorizer import HashedTfidfVectorizer
+
+# Bump when the feature layout changes so stale model files are retrained
+MODEL_VERSION = 1
+ALPHAS = (0.1, 1.0, 10.0, 100.0)
+HOLDOUT_FRACTION = 0.2
+TAG_BUCKETS = 32
+LANGUAGES = ("English", "Hinglish")
+META_COLUMNS = 6 + len(LANGUAGES) + TAG_BUCKETS
+
+EMOJI_RE = re.compile("[\U0001F300-\U0001FAFF☀-➿]")
+HASHTAG_RE = re.compile(r"#\w+")
+
+
+def model_path(file_path):
+    return os.path.splitext(file_path)[0] + ".engagement.npz"
+
+
+class EngagementModel:
+    """Predict a post's engagement from its text, language, tags and length"""
+
+    def __init__(self, vectorizer=None, alpha=1.0):
+        self.vectorizer = vectorizer or HashedTfidfVectorizer()
+        self.alpha = alpha
+        self.weights = None
+        self.bias = 0.0
+        self.mean = None
+        self.scale = None
+        self.stats = {}
+
+    def features(self, texts, metas=None):
+        """Feature matrix: text vectors, then standardised metadata columns"""
+        return self.combine(self.vectorizer.transform(texts), self.meta_matrix(texts, metas))
+
+    def meta_matrix(self, texts, metas=None):
+        metas = metas or [{}] * len(texts)
+        rows = [self.meta_features(text, meta) for text, meta in zip(texts, metas)]
+        return np.array(rows, dtype=np.float32).reshape(len(texts), META_COLUMNS)
+
+    def combine(self, text_vectors, meta):
+        return np.hstack([text_vectors, (meta - self.mean) / self.scale])
+
+    @staticmethod
+    def meta_features(text, meta):
+        line_count = meta.get("line_count") or text.count("\n") + 1
+        try:
+            line_count = float(line_count)
+        except (TypeError, ValueError):
+            line_count = text.count("\n") + 1
+        row = [
+            np.log1p(line_count),
+            np.log1p(len(text)),
+            np.log1p(len(text.split())),
+            len(EMOJI_RE.findall(text)),
+            len(HASHTAG_RE.findall(text)),
+            text.count("?"),
+        ]
+        row += [float(meta.get("language") == language) for language in LANGUAGES]
+        tag_row = [0.0] * TAG_BUCKETS
+        tags = meta.get("tags")
+        for tag in tags if isinstance(tags, list) else []:
+            if isinstance(tag, str):
+                tag_row[hash_tag(tag)] = 1.0
+        return row + tag_row
+
+    def fit(self, records, seed=0):
+        """Train on records with text and engagement; picks alpha on a holdout split"""
+        records = [record for record in records if isinstance(record.get("text"), str)]
+        texts = [record["text"] for record in records]
+        target = np.log1p(np.array([max(FewShotPosts.to_number(record.get("engagement")), 0) for record in records]))
+        text_vectors = self.vectorizer.fit_transform(texts)
+        meta = self.meta_matrix(texts, records)
+        self.mean = meta.mean(axis=0) if len(texts) else np.zeros(META_COLUMNS, dtype=np.float32)
+        scale = meta.std(axis=0) if len(texts) else np.ones(META_COLUMNS, dtype=np.float32)
+        self.scale = np.where(scale > 0, scale, 1).astype(np.float32)
+        X = self.combine(text_vectors, meta)
+
+        order = np.random.default_rng(seed).permutation(len(texts))
+        holdout = order[:int(len(texts) * HOLDOUT_FRACTION)]
+        train = order[len(holdout):]
+        scores = {}
+        if len(holdout) >= 5:
+            for alpha in ALPHAS:
+                weights, bias = ridge(X[train], target[train], alpha)
+                scores[alpha] = r2_score(target[holdout], X[holdout] @ weights + bias)
+            self.alpha = max(scores, key=scores.get)
+        self.weights, self.bias = ridge(X, target, self.alpha)
+        self.stats = {
+            "posts": len(texts),
+            "alpha": self.alpha,
+            "holdout_r2": scores.get(self.alpha),
+            "train_r2": r2_score(target, X @ self.weights + self.bias) if len(texts) else None,
+        }
+        return self
+
+    def predict(self, texts, metas=None):
+        """Predicted engagement (reactions) for a batch of posts"""
+        if not texts:
+            return np.empty(0)
+        if self.weights is None:
+            raise ValueError("Engagement model is not trained")
+        return np.maximum(np.expm1(self.features(texts, metas) @ self.weights + self.bias), 0)
+
+    def save(self, path, source_hash=None):
+        state = self.vectorizer.get_state()
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            version=MODEL_VERSION, source_hash=source_hash or "",
+            weights=self.weights, bias=self.bias, mean=self.mean, scale=self.scale, alpha=self.alpha,
+            idf=state["idf"], n_features=state["n_features"], dims=state["dims"], seed=state["seed"],
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, source_hash=None):
+        """Load a saved model; None if missing, outdated or trained on other data"""
+        try:
+            with np.load(path) as data:
+                if int(data["version"]) != MODEL_VERSION:
+                    return None
+                if source_hash is not None and str(data["source_hash"]) != source_hash:
+                    return None
+                vectorizer = HashedTfidfVectorizer.from_state({
+                    "n_features": int(data["n_features"]), "dims": int(data["dims"]),
+                    "seed": int(data["seed"]), "idf": data["idf"],
+                })
+                model = cls(vectorizer, float(data["alpha"]))
+                model.weights = data["weights"]
+                model.bias = float(data["bias"])
+                model.mean = data["mean"]
+                model.scale = data["scale"]
+        except (OSError, KeyError, ValueError):
+            return None
+        return model
+
+
+def ridge(X, y, alpha):
+    """Closed-form ridge regression with an unpenalised intercept"""
+    if not len(y):
+        return np.zeros(X.shape[1]), 0.0
+    x_mean = X.mean(axis=0)
+    y_mean = y.mean()
+    Xc = X - x_mean
+    weights = np.linalg.solve(Xc.T @ Xc + alpha * np.eye(X.shape[1]), Xc.T @ (y - y_mean))
+    return weights, float(y_mean - x_mean @ weights)
+
+
+def r2_score(actual, predicted):
+    total = ((actual - actual.mean()) ** 2).sum()
+    return float(1 - ((actual - predicted) ** 2).sum() / total) if total > 0 else 0.0
+
+
+def hash_tag(tag):
+    return zlib.crc32(tag.lower().encode("utf-8")) % TAG_BUCKETS
+
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_engagement_model(file_path=DEFAULT_POSTS_PATH):
+    """Process-wide model for the corpus at file_path.
+
+    Loaded from the saved model when it was trained on the same content,
+    otherwise trained and saved. Retrained when the corpus changes.
+    """
+    key = os.path.abspath(file_path)
+    with _models_lock:
+        cached = _models.get(key)
+        signature = file_signature(file_path)
+        if cached is not None and cached[0] == signature:
+            return cached[2]
+        source_hash = file_hash(file_path)
+        if cached is not None and cached[1] == source_hash:
+            _models[key] = (signature, source_hash, cached[2])
+            return cached[2]
+        path = model_path(file_path)
+        model = EngagementModel.load(path, source_hash)
+        if model is None:
+            model = EngagementModel().fit(iter_records(file_path))
+            try:
+                model.save(path, source_hash)
+            except OSError as e:
+                print(f"Could not save engagement model: {e}")
+        _models[key] = (signature, source_hash, model)
+        return model
+
+
+if __name__ == "__main__":
+    posts_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_POSTS_PATH
+    model = EngagementModel().fit(iter_records(posts_path))
+    model.save(model_path(posts_path), file_hash(posts_path))
+    print(model.stats)
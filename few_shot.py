@@ -1,36 +1,264 @@
+import hashlib
 import json
+import os
+import shutil
+import threading
+import numpy as np
 import pandas as pd
+from post_io import iter_records
+from vectorizer import HashedTfidfVectorizer, top_k_indices
 import re
 from pathlib import Path
 
+# "similar" ranks examples by topic/tone similarity blended with engagement;
+# "exact" keeps the (length, language, tag) filter and only falls back to ranking
+FEW_SHOT_MODE = os.getenv("FEW_SHOT_MODE", "similar")
+ENGAGEMENT_WEIGHT = float(os.getenv("FEW_SHOT_ENGAGEMENT_WEIGHT", "0.3"))
+
+# Score bonuses so exact attribute matches rank first when they exist
+LANGUAGE_BONUS = 1.0
+TAG_BONUS = 0.5
+LENGTH_BONUS = 0.2
+
+# Words that pull the similarity query towards posts written in each tone
+TONE_KEYWORDS = {
+    "Professional": "insights experience industry team growth strategy",
+    "Casual": "honestly just lol guys weekend coffee",
+    "Inspirational": "dream believe never give up journey success inspire",
+    "Humorous": "funny joke haha lol like meme",
+    "Opinionated": "unpopular opinion truth broken system should stop",
+}
+
+DEFAULT_POSTS_PATH = './data/processed_posts.json'
+
+# Bump when the snapshot layout or anything it caches changes
+SNAPSHOT_VERSION = 2
+# Columns written to the snapshot directory, one memory-mapped .npy file each
+SNAPSHOT_ARRAYS = (
+    "vectors", "idf", "engagement", "language_codes", "length_codes",
+    "tag_codes", "tag_offsets", "text", "text_offsets",
+)
+# Record columns rebuilt from the arrays above rather than stored as their own column
+CODED_COLUMNS = ("text", "tags", "language", "length")
+
 class FewShotPosts:
-    def __init__(self, file_path='./data/processed_posts.json'):
-        self.df = None
+    def __init__(self, file_path=DEFAULT_POSTS_PATH, use_snapshot=True):
+        self._df = None
+        self.source_signature = None
+        self.source_hash = None
         self.unique_tags = None
         self.tag_categories = None
-        self.load_posts(file_path)
+        self.index = {}
+        self.records = []
+        self.vectorizer = None
+        self.vectors = None
+        self.engagement = None
+        self.language_codes = None
+        self.language_ids = {}
+        self.length_codes = None
+        self.length_ids = {}
+        self.tag_codes = None
+        self.tag_offsets = None
+        self.tag_ids = {}
+        self.tag_rows = {}
+        if not (use_snapshot and self.load_snapshot(file_path)):
+            self.load_posts(file_path)
+            if use_snapshot:
+                self.save_snapshot(file_path)
+    
+    @property
+    def df(self):
+        """Posts as a DataFrame, built on first use when loaded from a snapshot"""
+        if self._df is None and len(self.records):
+            self._df = pd.DataFrame(list(self.records))
+        return self._df
+    
+    @df.setter
+    def df(self, value):
+        self._df = value
     
     def load_posts(self, file_path):
         try:
-            with open(file_path, "r", encoding="utf-8") as file:
-                posts = json.load(file)
-                df = pd.json_normalize(posts)
-                
-                # Clean and standardize data
-                df["text"] = df["text"].apply(self.clean_text)
-                df["length"] = df["line_count"].apply(self.categorize_length)
-                
-                # Extract and unify tags
-                all_tags = df["tags"].explode().dropna()
-                self.unique_tags = sorted(set(all_tags))
-                self.tag_categories = self.categorize_tags(self.unique_tags)
-                
-                self.df = df
+            self.source_signature = file_signature(file_path)
+            self.source_hash = file_hash(file_path)
+            # Accepts the processed output as a JSON array or JSONL
+            posts = list(iter_records(file_path))
+            df = pd.json_normalize(posts)
+            
+            # Clean and standardize data
+            df["text"] = df["text"].apply(self.clean_text)
+            df["length"] = df["line_count"].apply(self.categorize_length)
+            
+            # Extract and unify tags
+            all_tags = df["tags"].explode().dropna()
+            self.unique_tags = sorted(set(all_tags))
+            self.tag_categories = self.categorize_tags(self.unique_tags)
+            
+            self.df = df
+            self.records = df.to_dict(orient='records')
+            self.build_vectors(self.records)
+            self.build_index()
         except FileNotFoundError:
             raise Exception(f"Posts data file not found at {file_path}")
         except json.JSONDecodeError:
             raise Exception(f"Invalid JSON format in {file_path}")
     
+    def load_snapshot(self, file_path):
+        """Load the precompiled snapshot next to file_path if it matches the source.
+
+        Every column is memory-mapped and the index is rebuilt from the
+        integer codes; post dicts are only built when a post is returned.
+        Returns False when there is no usable snapshot.
+        """
+        snapshot_dir = snapshot_path(file_path)
+        try:
+            with open(os.path.join(snapshot_dir, "meta.json"), encoding="utf-8") as file:
+                meta = json.load(file)
+            if meta.get("version") != SNAPSHOT_VERSION:
+                return False
+            signature = file_signature(file_path)
+            if list(signature) != meta["source_signature"]:
+                # Touched but possibly unchanged: fall back to comparing content
+                if file_hash(file_path) != meta["source_hash"]:
+                    return False
+            arrays = {
+                name: np.load(os.path.join(snapshot_dir, name + ".npy"), mmap_mode="r")
+                for name in SNAPSHOT_ARRAYS + tuple(meta["array_columns"].values())
+            }
+        except (OSError, KeyError, ValueError, TypeError, AttributeError):
+            return False
+        self.vectorizer = HashedTfidfVectorizer.from_state(dict(meta["vectorizer"], idf=arrays["idf"]))
+        self.vectors = arrays["vectors"]
+        self.engagement = arrays["engagement"]
+        self.language_codes = arrays["language_codes"]
+        self.length_codes = arrays["length_codes"]
+        self.tag_codes = arrays["tag_codes"]
+        self.tag_offsets = arrays["tag_offsets"]
+        self.language_ids = {value: code for code, value in enumerate(meta["languages"])}
+        self.length_ids = {value: code for code, value in enumerate(meta["lengths"])}
+        self.tag_ids = {value: code for code, value in enumerate(meta["tags"])}
+        self.unique_tags = meta["unique_tags"]
+        self.tag_categories = meta["tag_categories"]
+        self.records = SnapshotRecords(arrays, meta)
+        self.build_index()
+        self.source_signature = signature
+        self.source_hash = meta["source_hash"]
+        return True
+    
+    def save_snapshot(self, file_path):
+        """Write the loaded corpus as a snapshot directory next to file_path.
+
+        Each column is one .npy file: post text as UTF-8 bytes plus offsets,
+        language, length and tags as integer codes, other numeric fields as
+        they are. Non-numeric extra fields go to meta.json with the vocabularies.
+        """
+        snapshot_dir = snapshot_path(file_path)
+        df = self.df
+        texts = [text.encode("utf-8") for text in df["text"]]
+        arrays = {
+            "vectors": self.vectors,
+            "idf": self.vectorizer.idf,
+            "engagement": self.engagement,
+            "language_codes": self.language_codes,
+            "length_codes": self.length_codes,
+            "tag_codes": self.tag_codes,
+            "tag_offsets": self.tag_offsets,
+            "text": np.frombuffer(b"".join(texts), dtype=np.uint8),
+            "text_offsets": np.cumsum([0] + [len(text) for text in texts], dtype=np.int64),
+        }
+        state = self.vectorizer.get_state()
+        meta = {
+            "version": SNAPSHOT_VERSION,
+            "source_signature": list(self.source_signature),
+            "source_hash": self.source_hash,
+            "vectorizer": {key: state[key] for key in ("n_features", "dims", "seed")},
+            "unique_tags": self.unique_tags,
+            "tag_categories": self.tag_categories,
+            "languages": list(self.language_ids),
+            "lengths": list(self.length_ids),
+            "tags": list(self.tag_ids),
+            "columns": list(df.columns),
+            "array_columns": {},
+            "json_columns": {},
+        }
+        for number, column in enumerate(df.columns):
+            if column in CODED_COLUMNS:
+                continue
+            if pd.api.types.is_numeric_dtype(df[column]):
+                meta["array_columns"][column] = f"column_{number}"
+                arrays[f"column_{number}"] = df[column].to_numpy()
+            else:
+                meta["json_columns"][column] = df[column].tolist()
+        tmp_dir = snapshot_dir + ".tmp"
+        try:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_dir, name + ".npy"), np.asarray(array))
+            with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as file:
+                json.dump(meta, file, default=str)
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+            os.replace(tmp_dir, snapshot_dir)
+        except OSError as e:
+            print(f"Could not write posts snapshot: {e}")
+    
+    def build_index(self):
+        """Map each tag, and each (length, language, tag), to its rows in file order"""
+        size = len(self.tag_offsets) - 1
+        rows = np.repeat(np.arange(size, dtype=np.int64), np.diff(self.tag_offsets))
+        # Unique (tag, row) pairs: a tag repeated in one post counts once, rows stay sorted
+        pairs = np.sort(np.asarray(self.tag_codes, dtype=np.int64) * size + rows)
+        pairs = pairs[np.r_[True, pairs[1:] != pairs[:-1]]] if len(pairs) else pairs
+        tags, rows = pairs // max(size, 1), pairs % max(size, 1)
+        tag_names = list(self.tag_ids)
+        self.tag_rows = {tag_names[tag]: tag_rows for tag, tag_rows in split_runs(tags, rows)}
+        lengths, languages = len(self.length_ids), len(self.language_ids)
+        groups = (tags * lengths + self.length_codes[rows]) * languages + self.language_codes[rows]
+        order = np.argsort(groups, kind="stable")
+        length_names, language_names = list(self.length_ids), list(self.language_ids)
+        self.index = {}
+        for group, group_rows in split_runs(groups[order], rows[order]):
+            tag, rest = divmod(group, lengths * languages)
+            length, language = divmod(rest, languages)
+            self.index[(length_names[length], language_names[language], tag_names[tag])] = group_rows
+    
+    def build_vectors(self, records):
+        """Vectorize post text and tags and precompute ranking columns"""
+        self.vectorizer = HashedTfidfVectorizer()
+        self.vectors = self.vectorizer.fit_transform([
+            f"{record['text']} {' '.join(self.record_tags(record))}" for record in records
+        ])
+        engagement = np.log1p(np.array(
+            [max(self.to_number(record.get("engagement")), 0) for record in records], dtype=np.float32
+        ))
+        top = engagement.max() if len(engagement) else 0
+        self.engagement = engagement / top if top > 0 else engagement
+        self.language_codes, self.language_ids = self.encode([record["language"] for record in records])
+        self.length_codes, self.length_ids = self.encode([record["length"] for record in records])
+        tags = [self.record_tags(record) for record in records]
+        self.tag_codes, self.tag_ids = self.encode([tag for record_tags in tags for tag in record_tags])
+        self.tag_offsets = np.cumsum([0] + [len(record_tags) for record_tags in tags], dtype=np.int64)
+    
+    @staticmethod
+    def encode(values):
+        """Integer-code a column so comparisons are vectorised"""
+        ids = {}
+        codes = np.array([ids.setdefault(value, len(ids)) for value in values], dtype=np.int32)
+        return codes, ids
+    
+    @staticmethod
+    def record_tags(record):
+        tags = record.get("tags")
+        return tags if isinstance(tags, list) else []
+    
+    @staticmethod
+    def to_number(value):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return 0.0
+        return 0.0 if np.isnan(value) else value
+    
     def clean_text(self, text):
         """Clean text by removing special characters and extra whitespace"""
         if not isinstance(text, str):
@@ -89,14 +317,147 @@ class FewShotPosts:
         return self.tag_categories
     
     def get_filtered_posts(self, length, language, tag, limit=3):
-        """Get filtered posts with error handling"""
+        """Get posts matching length, language and tag from the prebuilt index.
+
+        The returned dicts are shared with the corpus and must not be mutated.
+        """
         try:
-            df_filtered = self.df[
-                (self.df["length"] == length) &
-                (self.df["language"] == language) &
-                (self.df["tags"].apply(lambda x: tag in x if isinstance(x, list) else False))
-            ]
-            return df_filtered.head(limit).to_dict(orient='records')
+            return [self.records[row] for row in self.index.get((length, language, tag), ())[:limit]]
         except Exception as e:
             print(f"Error filtering posts: {e}")
-            return []
\ No newline at end of file
+            return []
+    
+    def get_examples(self, length, language, tag, tone="Professional", limit=3, mode=None):
+        """Pick few-shot examples, falling back to similarity ranking when no post matches exactly"""
+        if (mode or FEW_SHOT_MODE) == "exact":
+            posts = self.get_filtered_posts(length, language, tag, limit)
+            if posts:
+                return posts
+        return self.get_similar_posts(length, language, tag, tone, limit)
+    
+    def get_similar_posts(self, length, language, tag, tone="Professional", limit=3):
+        """Rank posts by similarity to the topic and tone, blended with engagement"""
+        return self.get_similar_posts_batch([(length, language, tag, tone)], limit)[0]
+    
+    def get_similar_posts_batch(self, requests, limit=3, engagement_weight=None):
+        """Top-k examples for a batch of (length, language, tag, tone) requests.
+
+        Every request is scored against the whole corpus in a single matrix
+        product; posts matching the language, tag and length get bonuses so
+        exact matches come first whenever they exist.
+        """
+        if self.vectors is None or not len(self.vectors) or not requests:
+            return [[] for _ in requests]
+        weight = ENGAGEMENT_WEIGHT if engagement_weight is None else engagement_weight
+        queries = self.vectorizer.transform([
+            f"{tag} {tag} {TONE_KEYWORDS.get(tone, tone)}" for _, _, tag, tone in requests
+        ])
+        scores = (self.vectors @ queries.T) * (1 - weight)
+        scores += (weight * self.engagement)[:, None]
+        for column, (length, language, tag, _) in enumerate(requests):
+            language_id = self.language_ids.get(language)
+            if language_id is not None:
+                scores[:, column] += LANGUAGE_BONUS * (self.language_codes == language_id)
+            length_id = self.length_ids.get(length)
+            if length_id is not None:
+                scores[:, column] += LENGTH_BONUS * (self.length_codes == length_id)
+            rows = self.tag_rows.get(tag)
+            if rows is not None:
+                scores[rows, column] += TAG_BONUS
+        top = top_k_indices(scores, limit)
+        return [[self.records[row] for row in top[:, column]] for column in range(len(requests))]
+
+class SnapshotRecords:
+    """Post dicts of a snapshot, each rebuilt from the columns on first access"""
+
+    def __init__(self, arrays, meta):
+        self.arrays = arrays
+        self.columns = meta["columns"]
+        self.array_columns = {column: arrays[name] for column, name in meta["array_columns"].items()}
+        self.json_columns = meta["json_columns"]
+        self.tag_names = meta["tags"]
+        self.language_names = meta["languages"]
+        self.length_names = meta["lengths"]
+        self.cache = {}
+
+    def __len__(self):
+        return len(self.arrays["text_offsets"]) - 1
+
+    def __iter__(self):
+        return (self[row] for row in range(len(self)))
+
+    def __getitem__(self, row):
+        row = int(row)
+        record = self.cache.get(row)
+        if record is None:
+            record = self.cache.setdefault(row, self.build(row))
+        return record
+
+    def build(self, row):
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        record = {}
+        for column in self.columns:
+            if column == "text":
+                start, end = self.arrays["text_offsets"][row:row + 2]
+                record[column] = bytes(self.arrays["text"][start:end]).decode("utf-8")
+            elif column == "tags":
+                start, end = self.arrays["tag_offsets"][row:row + 2]
+                record[column] = [self.tag_names[code] for code in self.arrays["tag_codes"][start:end]]
+            elif column == "language":
+                record[column] = self.language_names[self.arrays["language_codes"][row]]
+            elif column == "length":
+                record[column] = self.length_names[self.arrays["length_codes"][row]]
+            elif column in self.array_columns:
+                record[column] = self.array_columns[column][row].item()
+            else:
+                record[column] = self.json_columns[column][row]
+        return record
+
+def split_runs(keys, values):
+    """(key, values) for each run of equal keys in a sorted array"""
+    if not len(keys):
+        return []
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return zip(keys[starts].tolist(), np.split(values, starts[1:]))
+
+def snapshot_path(file_path):
+    return os.path.splitext(file_path)[0] + ".snapshot"
+
+def file_signature(file_path):
+    stat = os.stat(file_path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def file_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+_corpora = {}
+_corpora_lock = threading.Lock()
+
+def get_few_shot(file_path=DEFAULT_POSTS_PATH):
+    """Process-wide FewShotPosts for file_path.
+
+    The instance is shared across callers (and Streamlit reruns) and is
+    only reloaded when the file's mtime/size changes and its content hash
+    differs from the loaded one.
+    """
+    key = os.path.abspath(file_path)
+    with _corpora_lock:
+        corpus = _corpora.get(key)
+        if corpus is not None:
+            try:
+                signature = file_signature(file_path)
+            except OSError:
+                return corpus
+            if signature == corpus.source_signature:
+                return corpus
+            if file_hash(file_path) == corpus.source_hash:
+                corpus.source_signature = signature
+                return corpus
+        corpus = FewShotPosts(file_path)
+        _corpora[key] = corpus
+        return corpus
@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import inc
+
+# Memory hits are written back to the `accessed` column in batches of this size
+ACCESS_FLUSH_SIZE = 64
+
+
+def cache_key(model_name, prompt, params=None):
+    """Content address for a completion: hash of model, rendered prompt and params"""
+    payload = json.dumps(
+        {"model": model_name, "prompt": prompt, "params": params or {}},
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Disk-backed (SQLite) response cache with an in-memory LRU in front.
+
+    Entries older than `max_age` seconds are treated as misses and removed;
+    when the stored text exceeds `max_bytes` the least recently used
+    entries are evicted. Hits served from memory update `accessed` on disk
+    in batches, and always before an eviction, so hot entries are not
+    mistaken for cold ones.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, max_age=30 * 24 * 3600, memory_items=512):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.memory_items = memory_items
+        self.memory = OrderedDict()
+        self.touched = {}
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, content TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key):
+        """Return the cached content for key, or None on a miss"""
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None and now - entry[1] <= self.max_age:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                self.touched[key] = now
+                if len(self.touched) >= ACCESS_FLUSH_SIZE:
+                    self._flush_accessed()
+                    self.conn.commit()
+                return entry[0]
+            self.memory.pop(key, None)
+
+            row = self.conn.execute(
+                "SELECT content, size, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            content, size, created = row
+            if now - created > self.max_age:
+                self._delete(key, size)
+                self.conn.commit()
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self._remember(key, content, created)
+            self.hits += 1
+            return content
+
+    def put(self, key, content):
+        """Store content under key and evict old entries if over budget"""
+        now = time.time()
+        size = len(content.encode("utf-8"))
+        with self.lock:
+            row = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.total_bytes -= row[0]
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, content, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, content, size, now, now),
+            )
+            self.total_bytes += size
+            self._remember(key, content, now)
+            self._evict()
+            self.conn.commit()
+
+    def delete(self, key):
+        """Remove one entry, e.g. a response the caller could not use"""
+        with self.lock:
+            row = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._delete(key, row[0])
+                self.conn.commit()
+            self.memory.pop(key, None)
+
+    def prune(self):
+        """Drop expired entries and enforce the size budget"""
+        with self.lock:
+            cutoff = time.time() - self.max_age
+            self.conn.execute("DELETE FROM responses WHERE created < ?", (cutoff,))
+            self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            self.memory = OrderedDict((k, v) for k, v in self.memory.items() if v[1] >= cutoff)
+            self._evict()
+            self.conn.commit()
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+            self.memory.clear()
+            self.touched.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "memory_hits": self.memory_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0],
+                "bytes": self.total_bytes,
+            }
+
+    def _remember(self, key, content, created):
+        self.memory[key] = (content, created)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def _flush_accessed(self):
+        if self.touched:
+            self.conn.executemany(
+                "UPDATE responses SET accessed = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self.touched.items()],
+            )
+            self.touched.clear()
+
+    def _delete(self, key, size):
+        self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+        self.total_bytes -= size
+        self.memory.pop(key, None)
+        self.touched.pop(key, None)
+
+    def _evict(self):
+        if self.total_bytes > self.max_bytes:
+            self._flush_accessed()
+        while self.total_bytes > self.max_bytes:
+            rows = self.conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self.total_bytes = 0
+                break
+            for key, size in rows:
+                self._delete(key, size)
+                if self.total_bytes <= self.max_bytes:
+                    break
+
+
+class CachedResponse:
+    """Response returned on a cache hit; mirrors the `.content` of an AIMessage"""
+
+    def __init__(self, content):
+        self.content = content
+
+
+class CachedLLM:
+    """Wrap an LLM client so identical prompts are answered from the cache.
+
+    Pass `bypass_cache=True` to `invoke` for a fresh completion; the fresh
+    answer still replaces the cached one. `invalidate` drops the cached
+    answer to a prompt, so a response that could not be parsed is not
+    replayed. With `cache=None` every call goes straight to the wrapped
+    client.
+    """
+
+    def __init__(self, llm, cache, model_name=None, params=None):
+        self.llm = llm
+        self.cache = cache
+        self.model_name = model_name or getattr(llm, "model_name", type(llm).__name__)
+        self.params = params if params is not None else {"temperature": getattr(llm, "temperature", None)}
+
+    def invoke(self, prompt, bypass_cache=False, **kwargs):
+        if self.cache is None:
+            return self.llm.invoke(prompt, **kwargs)
+        key = self.key(prompt, kwargs)
+        if not bypass_cache:
+            content = self.cache.get(key)
+            inc("llm_cache_lookups_total", result="miss" if content is None else "hit")
+            if content is not None:
+                return CachedResponse(content)
+        response = self.llm.invoke(prompt, **kwargs)
+        self.cache.put(key, response.content)
+        return response
+
+    def stream(self, prompt, bypass_cache=False, **kwargs):
+        """Stream chunks; a hit is yielded as one chunk and a completed miss is cached"""
+        if self.cache is None:
+            yield from self.llm.stream(prompt, **kwargs)
+            return
+        key = self.key(prompt, kwargs)
+        if not bypass_cache:
+            content = self.cache.get(key)
+            inc("llm_cache_lookups_total", result="miss" if content is None else "hit")
+            if content is not None:
+                yield CachedResponse(content)
+                return
+        parts = []
+        for chunk in self.llm.stream(prompt, **kwargs):
+            parts.append(chunk.content)
+            yield chunk
+        self.cache.put(key, "".join(parts))
+
+    def invalidate(self, prompt, **kwargs):
+        """Forget the cached answer to prompt (called with the same kwargs as invoke)"""
+        if self.cache is not None:
+            self.cache.delete(self.key(prompt, kwargs))
+
+    def key(self, prompt, kwargs):
+        text = prompt.to_string() if hasattr(prompt, "to_string") else str(prompt)
+        return cache_key(self.model_name, text, {**self.params, **kwargs})
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
@@ -1,13 +1,56 @@
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
+from llm_cache import CachedLLM, ResponseCache
+from llm_pool import Backend, LLMPool
 
 import os
 
 
 load_dotenv()
-llm=ChatGroq(groq_api_key=os.getenv("GROQ_API_KEY"), model_name="deepseek-r1-distill-llama-70b")
+
+def build_backends(spec):
+    """Backends from a comma-separated list of `model` or `model@base_url` entries"""
+    entries = [entry.strip() for entry in spec.split(",") if entry.strip()]
+    backends = []
+    for entry in entries:
+        model, _, base_url = entry.partition("@")
+        client = ChatGroq(
+            groq_api_key=os.getenv("GROQ_API_KEY"),
+            model_name=model,
+            base_url=base_url or None,
+            # With a fallback configured, fail over instead of retrying in place
+            max_retries=0 if len(entries) > 1 else 2,
+        )
+        backends.append(Backend(
+            entry, client,
+            max_failures=int(os.getenv("LLM_BACKEND_MAX_FAILURES", "3")),
+            cooldown=float(os.getenv("LLM_BACKEND_COOLDOWN", "30")),
+        ))
+    return backends
+
+# First backend is preferred; the others take over on errors and receive hedged requests
+hedge_after=float(os.getenv("LLM_HEDGE_AFTER", "0"))
+base_llm=LLMPool(
+    build_backends(os.getenv("LLM_BACKENDS", "deepseek-r1-distill-llama-70b")),
+    hedge_after=hedge_after or None,
+)
+
+# Every caller goes through the response cache unless LLM_CACHE_ENABLED=0
+if os.getenv("LLM_CACHE_ENABLED", "1") != "0":
+    cache=ResponseCache(
+        os.getenv("LLM_CACHE_PATH", "./data/llm_cache.sqlite3"),
+        max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024),
+        max_age=float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "30")) * 24 * 3600,
+        memory_items=int(os.getenv("LLM_CACHE_MEMORY_ITEMS", "512")),
+    )
+else:
+    cache=None
+llm=CachedLLM(base_llm, cache)
 
 if __name__=="__main__":
     response=llm.invoke("What is the capital of France?")
     print(response)
-    print("LLM initialized successfully.")
\ No newline at end of file
+    print("LLM initialized successfully.")
+    if cache is not None:
+        print(cache.stats())
+    print(base_llm.health())
@@ -0,0 +1,172 @@
+"""Multi-backend LLM client with health tracking, failover and hedged requests.
+
+`LLMPool` wraps several chat clients (different models or providers)
+behind the `invoke`/`stream` interface the rest of the app uses. Backends
+are tried in configured order, skipping ones whose circuit is open after
+repeated failures. A request that fails moves on to the next backend; a
+request still unanswered after `hedge_after` seconds is duplicated on the
+next backend and whichever answers first wins.
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import inc, observe
+
+
+class Backend:
+    """One chat client plus its health: consecutive failures and a latency average"""
+
+    def __init__(self, name, client, max_failures=3, cooldown=30.0):
+        self.name = name
+        self.client = client
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self.latency = None
+        self.calls = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def healthy(self, now=None):
+        return (now or time.monotonic()) >= self.open_until
+
+    def record_success(self, latency):
+        with self.lock:
+            self.calls += 1
+            self.failures = 0
+            self.open_until = 0.0
+            # Exponentially weighted, so a recovering backend is not judged by old samples
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        inc("llm_backend_calls_total", backend=self.name, result="ok")
+        observe("llm_backend_seconds", latency, backend=self.name)
+
+    def record_failure(self):
+        with self.lock:
+            self.calls += 1
+            self.errors += 1
+            self.failures += 1
+            if self.failures >= self.max_failures:
+                # Open the circuit; the next call after the cooldown is a trial
+                self.open_until = time.monotonic() + self.cooldown
+                self.failures = self.max_failures - 1
+        inc("llm_backend_calls_total", backend=self.name, result="error")
+
+    def status(self):
+        with self.lock:
+            return {
+                "name": self.name,
+                "healthy": self.healthy(),
+                "consecutive_failures": self.failures,
+                "latency": self.latency,
+                "calls": self.calls,
+                "errors": self.errors,
+            }
+
+
+class LLMPool:
+    """Drop-in LLM client over several backends.
+
+    `hedge_after` (seconds, None to disable) bounds how long one backend
+    may keep a request to itself before it is also sent to the next one;
+    at most `max_in_flight` copies run at once. Streams hedge and fail over
+    until the first chunk arrives, then stay on the backend that sent it.
+    Losing requests run to completion in the background and only update
+    health. `model_name` is the first backend's, so response cache keys do
+    not depend on which backend answered.
+    """
+
+    def __init__(self, backends, hedge_after=None, max_in_flight=2, max_workers=16):
+        if not backends:
+            raise ValueError("LLMPool needs at least one backend")
+        self.backends = list(backends)
+        self.hedge_after = hedge_after
+        self.max_in_flight = max_in_flight
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-pool")
+        self.model_name = getattr(self.backends[0].client, "model_name", self.backends[0].name)
+        self.temperature = getattr(self.backends[0].client, "temperature", None)
+
+    def ordered(self):
+        """Healthy backends in configured order, then open circuits as a last resort"""
+        now = time.monotonic()
+        return sorted(self.backends, key=lambda backend: not backend.healthy(now))
+
+    def invoke(self, prompt, **kwargs):
+        return self._race(lambda backend: backend.client.invoke(prompt, **kwargs))
+
+    def stream(self, prompt, **kwargs):
+        def open_stream(backend):
+            chunks = iter(backend.client.stream(prompt, **kwargs))
+            return next(chunks, None), chunks
+
+        first, chunks = self._race(open_stream, on_discard=lambda result: close(result[1]))
+        if first is None:
+            return
+        try:
+            yield first
+            yield from chunks
+        finally:
+            close(chunks)
+
+    def health(self):
+        return [backend.status() for backend in self.backends]
+
+    def _race(self, call, on_discard=None):
+        """Run call(backend) with failover and hedging; return the first success"""
+        candidates = self.ordered()
+        pending = {}
+        errors = []
+        next_index = 0
+
+        def timed_call(backend):
+            started = time.perf_counter()
+            try:
+                result = call(backend)
+            except Exception:
+                backend.record_failure()
+                raise
+            backend.record_success(time.perf_counter() - started)
+            return result
+
+        def launch():
+            nonlocal next_index
+            backend = candidates[next_index]
+            next_index += 1
+            pending[self.executor.submit(timed_call, backend)] = backend
+
+        launch()
+        try:
+            while pending:
+                can_hedge = (
+                    self.hedge_after is not None
+                    and next_index < len(candidates)
+                    and len(pending) < self.max_in_flight
+                )
+                done, _ = wait(pending, timeout=self.hedge_after if can_hedge else None,
+                               return_when=FIRST_COMPLETED)
+                if not done:
+                    inc("llm_hedged_requests_total")
+                    launch()
+                    continue
+                for future in done:
+                    pending.pop(future)
+                    if future.exception() is None:
+                        return future.result()
+                    errors.append(future.exception())
+                if not pending and next_index < len(candidates):
+                    inc("llm_failovers_total")
+                    launch()
+        finally:
+            if on_discard is not None:
+                for future in pending:
+                    future.add_done_callback(
+                        lambda f: on_discard(f.result()) if f.exception() is None else None
+                    )
+        raise errors[-1]
+
+
+def close(chunks):
+    """Stop a stream iterator early so its connection is released"""
+    if hasattr(chunks, "close"):
+        chunks.close()
@@ -0,0 +1,59 @@
+"""Post metadata that can be computed without the LLM.
+
+Line count is the number of newlines plus one. Language is classified
+from the script and a lexicon of common romanized Hindi words: Devanagari
+text or a high share of Hindi words is Hinglish, almost none is English,
+and posts in between get a low confidence so the caller can ask the model
+instead.
+"""
+import os
+import re
+
+# Share of Hindi words at or below which a post is English, and at or above which it is Hinglish
+ENGLISH_MAX_RATIO = float(os.getenv("ENGLISH_MAX_RATIO", "0.05"))
+HINGLISH_MIN_RATIO = float(os.getenv("HINGLISH_MIN_RATIO", "0.25"))
+# Language guesses below this confidence (0-1) are left to the LLM
+LANGUAGE_CONFIDENCE = float(os.getenv("LANGUAGE_CONFIDENCE", "0.6"))
+# Short posts are scored as if they had this many words, so one stray word does not decide
+MIN_WORDS = 10
+
+DEVANAGARI_RE = re.compile("[ऀ-ॿ]")
+WORD_RE = re.compile(r"[a-z]+")
+
+# Frequent romanized Hindi words that are not also common English words
+# ("main", "me", "to", "do", "tab", "par", "log" and the like are left out)
+HINDI_WORDS = frozenset("""
+    hai hain tha thi ho hota hoti hote hoga hogi hona nahi nahin kya kyun kyon kyunki kaise
+    kab kahan kaun kitna kitne mein mera meri mere tera teri tere apna apni apne hum humne hamara
+    humara aap aapka aapki aapke tum tumhe tumhara yeh woh wo unka unki unke uska uski uske iska
+    iski iske ka ki ke ko se aur bhi toh lekin magar isliye bas sirf bahut bohot accha acha achha
+    achi achhi theek thik kuch kuchh sab sabko koi yaar bhai dost karo karna karne karke kiya kiye
+    raha rahi rahe gaya gayi gaye diya liya dekh dekho dekhna baat baatein logon agar
+    matlab abhi phir naukri paisa paise zindagi kaam wala wali wale haan ji chahiye sakta sakte
+    sakti pata samajh bolo bola likhna sapna sapne jaise waise
+""".split())
+
+
+def count_lines(text):
+    """Number of lines in the post: its newlines plus one, ignoring leading and trailing whitespace"""
+    return text.strip().count("\n") + 1
+
+
+def detect_language(text):
+    """(language, confidence) of a post, confidence from 0 (a guess) to 1"""
+    if DEVANAGARI_RE.search(text):
+        return "Hinglish", 1.0
+    words = WORD_RE.findall(text.lower())
+    hindi = sum(1 for word in words if word in HINDI_WORDS)
+    ratio = hindi / max(len(words), MIN_WORDS)
+    hinglish = min(max((ratio - ENGLISH_MAX_RATIO) / (HINGLISH_MIN_RATIO - ENGLISH_MAX_RATIO), 0.0), 1.0)
+    return ("Hinglish" if hinglish >= 0.5 else "English"), abs(2 * hinglish - 1)
+
+
+def local_metadata(text, min_confidence=LANGUAGE_CONFIDENCE):
+    """Line count and, when confident enough, language of a post"""
+    metadata = {"line_count": count_lines(text)}
+    language, confidence = detect_language(text)
+    if confidence >= min_confidence:
+        metadata["language"] = language
+    return metadata
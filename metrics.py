@@ -0,0 +1,214 @@
+"""In-process metrics for the generation and preprocessing hot paths.
+
+Counters and histograms live in one process-wide registry. Code marks a
+stage with `span("prompt_render")`, counts events with `inc(...)` and
+records values with `observe(...)`; the registry exports Prometheus text
+or JSON, and keeps the most recent samples per histogram for percentiles.
+"""
+import json
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from prompt_budget import count_tokens
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+RECENT_SAMPLES = 1000
+
+HELP = {
+    "stage_seconds": "Time spent per hot-path stage",
+    "llm_time_to_first_token_seconds": "Streamed LLM calls: time to the first chunk",
+    "llm_tokens": "Tokens per LLM call (provider usage, or estimated locally)",
+    "llm_calls_total": "LLM calls by operation",
+    "llm_errors_total": "LLM calls that raised",
+    "llm_cache_lookups_total": "Response cache lookups by result",
+    "llm_backend_calls_total": "LLM pool calls per backend by result",
+    "llm_backend_seconds": "LLM pool call latency per backend (time to first chunk for streams)",
+    "llm_hedged_requests_total": "Requests duplicated on another backend after the hedge delay",
+    "llm_failovers_total": "Requests moved to another backend after an error",
+    "retries_total": "Transient errors retried by worker_pool",
+    "retry_failures_total": "Calls that failed with a permanent error or after exhausting retries",
+    "parse_failures_total": "LLM responses that could not be parsed",
+    "extract_batch_items_total": "Posts in batched extraction responses, by result",
+    "metadata_language_total": "Post languages decided locally or escalated to the LLM",
+    "coalesced_requests_total": "Requests that shared an identical in-flight LLM call",
+    "warm_pool_lookups_total": "Fresh variant requests answered from the warm pool, by result",
+    "warm_pool_evictions_total": "Pre-generated variants discarded for age",
+    "variant_regenerations_total": "Generated variants discarded as near-duplicates of another variant",
+    "prompt_tokens_saved": "Estimated prompt tokens removed by the prompt budget, per prompt",
+}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Histogram:
+    """Cumulative bucket counts plus a window of recent samples"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def summary(self):
+        recent = list(self.recent)
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": percentile(recent, 50),
+            "p95": percentile(recent, 95),
+            "p99": percentile(recent, 99),
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe store of labelled counters and histograms"""
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def counter_value(self, name, **labels):
+        """Sum of a counter over every label set matching `labels`"""
+        with self.lock:
+            return sum(
+                value for (counter, counter_labels), value in self.counters.items()
+                if counter == name and labels.items() <= dict(counter_labels).items()
+            )
+
+    def snapshot(self):
+        """Counters, histogram summaries and derived rates as plain data"""
+        with self.lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+            histograms = [
+                {"name": name, "labels": dict(labels), **histogram.summary()}
+                for (name, labels), histogram in sorted(self.histograms.items())
+            ]
+        hits = self.counter_value("llm_cache_lookups_total", result="hit")
+        lookups = self.counter_value("llm_cache_lookups_total")
+        return {
+            "counters": counters,
+            "histograms": histograms,
+            "cache_hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=4)
+
+    def to_prometheus(self):
+        """Render everything in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(
+                (key, histogram.buckets, list(histogram.counts), histogram.count, histogram.sum)
+                for key, histogram in self.histograms.items()
+            )
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            describe(name, "counter")
+            lines.append(f"{name}{format_labels(labels)} {value}")
+        for (name, labels), buckets, counts, count, total in histograms:
+            describe(name, "histogram")
+            for bound, bucket_count in zip(buckets, counts):
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', f'{bound:g}'),))} {bucket_count}")
+            lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+registry = MetricsRegistry()
+
+
+def inc(name, amount=1, **labels):
+    registry.inc(name, amount, **labels)
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    registry.observe(name, value, buckets, **labels)
+
+
+@contextmanager
+def span(stage, **labels):
+    """Time the enclosed block into the stage_seconds histogram"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe("stage_seconds", time.perf_counter() - started, stage=stage, **labels)
+
+
+def record_llm_call(operation, prompt_text, completion_text, usage=None):
+    """Count an LLM call and its prompt/completion tokens (`usage` as in AIMessage.usage_metadata)"""
+    usage = usage or {}
+    inc("llm_calls_total", operation=operation)
+    observe("llm_tokens", usage.get("input_tokens") or count_tokens(prompt_text),
+            TOKEN_BUCKETS, kind="prompt", operation=operation)
+    observe("llm_tokens", usage.get("output_tokens") or count_tokens(completion_text),
+            TOKEN_BUCKETS, kind="completion", operation=operation)
+
+
+def write_metrics(path):
+    """Export the registry to `path`: Prometheus text for .prom/.txt, JSON otherwise"""
+    text = registry.to_prometheus() if path.endswith((".prom", ".txt")) else registry.to_json()
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(text)
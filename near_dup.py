@@ -0,0 +1,114 @@
+"""Near-duplicate detection with MinHash signatures and LSH banding.
+
+Texts are reduced to word 3-gram shingles and a MinHash signature whose
+agreement rate estimates their Jaccard similarity. Signatures are split
+into bands; texts sharing any band land in the same bucket, so a lookup
+only compares against a handful of candidates and indexing a corpus stays
+linear in its size.
+"""
+import os
+import re
+import zlib
+
+import numpy as np
+
+# Estimated Jaccard similarity of word 3-grams at which two texts count as duplicates
+CORPUS_DUP_THRESHOLD = float(os.getenv("CORPUS_DUP_THRESHOLD", "0.85"))
+VARIANT_DUP_THRESHOLD = float(os.getenv("VARIANT_DUP_THRESHOLD", "0.8"))
+NUM_PERM = 64
+SHINGLE_SIZE = 3
+
+PRIME = 4294967291  # largest prime below 2**32, so a * x + b fits in uint64
+WORD_RE = re.compile(r"\w+")
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Distinct word n-grams of the lowercased text (its words if shorter)"""
+    words = WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return set(words)
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def choose_bands(threshold, num_perm):
+    """(bands, rows) whose LSH threshold (1/bands)**(1/rows) is the highest not above `threshold`"""
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if (1 / bands) ** (1 / rows) <= threshold:
+            best = (bands, rows)
+    return best
+
+
+class NearDuplicateIndex:
+    """Incremental MinHash/LSH index answering "have I seen a near-copy of this?"
+
+    Candidates from the LSH buckets are confirmed by comparing full
+    signatures, so reported matches have an estimated similarity of at
+    least `threshold`.
+    """
+
+    def __init__(self, threshold=CORPUS_DUP_THRESHOLD, num_perm=NUM_PERM, seed=1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, PRIME, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, PRIME, num_perm, dtype=np.uint64)
+        self.bands, self.rows = choose_bands(threshold, num_perm)
+        self.buckets = [{} for _ in range(self.bands)]
+        self.keys = []
+        self.signatures = np.empty((64, num_perm), dtype=np.uint32)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def signature(self, text):
+        values = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(text)), dtype=np.uint64
+        )
+        if not len(values):
+            return np.full(self.num_perm, PRIME, dtype=np.uint32)
+        hashed = (np.multiply.outer(self.a, values) + self.b[:, None]) % PRIME
+        return hashed.min(axis=1).astype(np.uint32)
+
+    def band_keys(self, signature):
+        rows = self.rows
+        return [signature[band * rows:(band + 1) * rows].tobytes() for band in range(self.bands)]
+
+    def query(self, text=None, signature=None):
+        """(key, estimated similarity) of indexed near-duplicates, most similar first"""
+        signature = self.signature(text) if signature is None else signature
+        candidates = set()
+        for bucket, band_key in zip(self.buckets, self.band_keys(signature)):
+            candidates.update(bucket.get(band_key, ()))
+        if not candidates:
+            return []
+        rows = np.fromiter(candidates, dtype=np.int64)
+        similarity = (self.signatures[rows] == signature).mean(axis=1)
+        matches = [(self.keys[row], float(score)) for row, score in zip(rows, similarity) if score >= self.threshold]
+        return sorted(matches, key=lambda match: -match[1])
+
+    def add(self, key, text=None, signature=None):
+        signature = self.signature(text) if signature is None else signature
+        row = len(self.keys)
+        if row == len(self.signatures):
+            self.signatures = np.concatenate([self.signatures, np.empty_like(self.signatures)])
+        self.signatures[row] = signature
+        self.keys.append(key)
+        for bucket, band_key in zip(self.buckets, self.band_keys(signature)):
+            bucket.setdefault(band_key, []).append(row)
+
+    def find_or_add(self, key, text):
+        """Key of an indexed near-duplicate of text, or None after indexing it under `key`"""
+        signature = self.signature(text)
+        matches = self.query(signature=signature)
+        if matches:
+            return matches[0][0]
+        self.add(key, signature=signature)
+        return None
+
+
+def find_near_duplicates(texts, threshold=VARIANT_DUP_THRESHOLD):
+    """Indices of texts that nearly repeat an earlier text in the list"""
+    index = NearDuplicateIndex(threshold)
+    return [i for i, text in enumerate(texts) if index.find_or_add(i, text) is not None]
@@ -1,9 +1,34 @@
 from llm_helper import llm
-from few_shot import FewShotPosts
+from few_shot import get_few_shot
+from metrics import TOKEN_BUCKETS, inc, observe, record_llm_call, span
+from prompt_budget import PROMPT_TOKEN_BUDGET, count_tokens, fit_examples
+from warm_pool import SingleFlight
 import re
+import time
 from langchain_core.prompts import PromptTemplate
 
-few_shot = FewShotPosts()
+# Compiled once at import instead of on every request
+POST_PROMPT = PromptTemplate.from_template("""
+    Generate a high-quality LinkedIn post with the following specifications:
+    
+    1) Topic: {tag}
+    2) Length: {length_str}
+    3) Language: {language}
+    4) Tone: {tone}
+    
+    Additional Guidelines:
+    - If Language is Hinglish, use a natural mix of Hindi and English words
+    - Include appropriate line breaks for readability
+    - Use emojis sparingly (2-3 per post)
+    - Make the post engaging and valuable for professionals
+    - Avoid overly promotional language
+    
+    {examples_section}
+    """)
+EXAMPLES_HEADER = "Here are some example posts for reference:\n\n"
+EXAMPLE_OVERHEAD_TOKENS = count_tokens("Example 1:\n")
+# Identical cacheable requests in flight at the same time share one LLM call
+flights = SingleFlight()
 
 def get_length_str(length):
     """Convert length category to word count range"""
@@ -14,16 +39,183 @@ def get_length_str(length):
     }
     return length_mapping.get(length, "6 to 10 lines (100-200 words)")
 
-def generate_post(length, language, tag, tone="Professional"):
-    """Generate a LinkedIn post with given parameters"""
+def generate_post(length, language, tag, tone="Professional", fresh=False):
+    """Generate a LinkedIn post with given parameters.
+
+    Identical requests are answered from the LLM response cache; pass
+    fresh=True to force a new completion (e.g. for extra variants).
+    """
+    try:
+        return generate_post_text(length, language, tag, tone, fresh=fresh)
+    except Exception as e:
+        print(f"Error generating post: {e}")
+        return "Sorry, there was an error generating your post. Please try again."
+
+def generate_post_text(length, language, tag, tone="Professional", fresh=False, llm_client=None):
+    """Like generate_post, but LLM errors propagate so callers can retry them.
+
+    Concurrent identical requests (fresh=False) are coalesced into one call.
+    """
+    llm_client = llm_client or llm
+    if not fresh:
+        return flights.do(
+            (id(llm_client), length, language, tag, tone),
+            lambda: request_post_text(length, language, tag, tone, fresh, llm_client),
+        )
+    return request_post_text(length, language, tag, tone, fresh, llm_client)
+
+def request_post_text(length, language, tag, tone, fresh, llm_client):
     prompt = build_prompt(length, language, tag, tone)
-    
     try:
-        response = llm.invoke(prompt)
+        with span("llm_call", operation="generate"):
+            response = llm_client.invoke(prompt, bypass_cache=fresh)
+    except Exception:
+        inc("llm_errors_total", operation="generate")
+        raise
+    record_llm_call("generate", prompt, response.content, getattr(response, "usage_metadata", None))
+    with span("post_process"):
         return extract_post_content(response.content)
+
+def generate_post_stream(length, language, tag, tone="Professional", fresh=False, stats=None):
+    """Stream a LinkedIn post, yielding visible text as it arrives.
+
+    The <think>...</think> reasoning section is suppressed incrementally.
+    If a `stats` dict is given it is filled with `ttft` (seconds to the
+    first visible text), `total_time`, `completion_tokens` (reported by
+    the provider, or estimated from the response length), the
+    `prompt_tokens`/`prompt_tokens_saved` estimates from build_prompt and
+    `error` (None on success). Concurrent identical requests (fresh=False)
+    follow one shared stream; their stats are filled when it ends.
+    """
+    if fresh:
+        return stream_post(length, language, tag, tone, fresh, stats)
+    return flights.stream(
+        ("stream", length, language, tag, tone),
+        lambda shared_stats: stream_post(length, language, tag, tone, fresh, shared_stats),
+        stats,
+    )
+
+def stream_post(length, language, tag, tone, fresh, stats=None):
+    stats = stats if stats is not None else {}
+    stats.update(ttft=None, total_time=None, completion_tokens=0, error=None)
+    prompt = build_prompt(length, language, tag, tone, stats=stats)
+    stripper = ThinkStripper()
+    start_time = time.perf_counter()
+    
+    def visible(text):
+        if text and stats["ttft"] is None:
+            stats["ttft"] = time.perf_counter() - start_time
+        return text
+    
+    raw_parts = []
+    usage = {}
+    strip_time = 0.0
+    try:
+        for chunk in llm.stream(prompt, bypass_cache=fresh):
+            if not raw_parts:
+                observe("llm_time_to_first_token_seconds", time.perf_counter() - start_time)
+            raw_parts.append(chunk.content)
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            strip_started = time.perf_counter()
+            text = visible(stripper.feed(chunk.content))
+            strip_time += time.perf_counter() - strip_started
+            if text:
+                yield text
+        raw = "".join(raw_parts)
+        # Without provider usage data (e.g. a cache hit) estimate locally
+        stats["completion_tokens"] = usage.get("output_tokens") or count_tokens(raw)
+        record_llm_call("generate", prompt, raw, usage)
+        text = visible(stripper.flush())
+        if text:
+            yield text
     except Exception as e:
+        inc("llm_errors_total", operation="generate")
         print(f"Error generating post: {e}")
-        return "Sorry, there was an error generating your post. Please try again."
+        stats["error"] = str(e)
+        yield visible("Sorry, there was an error generating your post. Please try again.")
+    finally:
+        stats["total_time"] = time.perf_counter() - start_time
+        observe("stage_seconds", stats["total_time"] - strip_time, stage="llm_call", operation="generate")
+        observe("stage_seconds", strip_time, stage="post_process")
+
+class ThinkStripper:
+    """Incremental version of extract_post_content for streamed responses.
+
+    Text inside <think>...</think> is dropped and tags are stripped even
+    when they are split across chunks; leading whitespace of the post and
+    trailing whitespace of the stream are trimmed. Text already shown cannot
+    be taken back, so reasoning that arrives without an opening <think>
+    stays visible.
+    """
+    MAX_TAG_LENGTH = 32
+    
+    def __init__(self):
+        self.buffer = ""
+        self.in_think = False
+        self.saw_think = False
+        self.started = False
+        self.pending_space = ""
+    
+    def feed(self, chunk):
+        """Consume a chunk and return the text that is safe to show"""
+        self.buffer += re.sub(r'[\ud800-\udfff]', '', chunk or "")
+        output = []
+        while self.buffer:
+            if self.in_think:
+                end = self.buffer.find('</think>')
+                if end == -1:
+                    # Keep a possible partial closing tag for the next chunk
+                    self.buffer = self.buffer[-(len('</think>') - 1):]
+                    break
+                self.buffer = self.buffer[end + len('</think>'):]
+                self.in_think = False
+                continue
+            start = self.buffer.find('<')
+            if start == -1:
+                output.append(self.buffer)
+                self.buffer = ""
+                break
+            output.append(self.buffer[:start])
+            self.buffer = self.buffer[start:]
+            end = self.buffer.find('>')
+            if end == -1:
+                if len(self.buffer) > self.MAX_TAG_LENGTH:
+                    # Too long to be a tag: a literal '<'
+                    output.append(self.buffer[0])
+                    self.buffer = self.buffer[1:]
+                    continue
+                break
+            tag = self.buffer[:end + 1]
+            self.buffer = self.buffer[end + 1:]
+            if tag == '<think>':
+                self.in_think = True
+                self.saw_think = True
+            elif tag == '</think>':
+                # Closing tag without an opening one: trim again for the post that follows
+                self.saw_think = True
+                self.started = False
+                self.pending_space = ""
+            elif self.saw_think:
+                # extract_post_content keeps tags in the text after </think>
+                output.append(tag)
+        return self._trim("".join(output))
+    
+    def flush(self):
+        """Return whatever is left at the end of the stream"""
+        rest = "" if self.in_think else self.buffer
+        self.buffer = ""
+        return self._trim(rest).rstrip()
+    
+    def _trim(self, text):
+        if not self.started:
+            text = text.lstrip()
+            if not text:
+                return ""
+            self.started = True
+        text = self.pending_space + text
+        stripped = text.rstrip()
+        self.pending_space = text[len(stripped):]
+        return stripped
 
 def extract_post_content(response_content):
     """Extract the post content from the LLM response"""
@@ -39,43 +231,46 @@ def extract_post_content(response_content):
     
     return response_content.strip()
 
-def build_prompt(length, language, tag, tone):
-    """Construct the prompt for the LLM"""
-    length_str = get_length_str(length)
-    
-    prompt_template = """
-    Generate a high-quality LinkedIn post with the following specifications:
-    
-    1) Topic: {tag}
-    2) Length: {length_str}
-    3) Language: {language}
-    4) Tone: {tone}
-    
-    Additional Guidelines:
-    - If Language is Hinglish, use a natural mix of Hindi and English words
-    - Include appropriate line breaks for readability
-    - Use emojis sparingly (2-3 per post)
-    - Make the post engaging and valuable for professionals
-    - Avoid overly promotional language
-    
-    {examples_section}
+def build_prompt(length, language, tag, tone, corpus=None, budget=None, stats=None):
+    """Construct the prompt for the LLM within a token budget.
+
+    Examples come from the shared corpus unless one is given, most relevant
+    first; they are trimmed or dropped so the whole prompt stays within
+    `budget` tokens (PROMPT_TOKEN_BUDGET by default). If a `stats` dict is
+    given it gets the estimated `prompt_tokens` and `prompt_tokens_saved`.
     """
+    budget = PROMPT_TOKEN_BUDGET if budget is None else budget
+    length_str = get_length_str(length)
     
     # Get relevant examples
-    examples = few_shot.get_filtered_posts(length, language, tag)
-    examples_section = ""
-    
-    if examples:
-        examples_section = "Here are some example posts for reference:\n\n"
-        for i, post in enumerate(examples, 1):
-            examples_section += f"Example {i}:\n{post['text']}\n\n"
+    with span("retrieval"):
+        examples = (corpus or get_few_shot()).get_examples(length, language, tag, tone)
     
-    prompt = PromptTemplate.from_template(prompt_template).format(
-        tag=tag,
-        length_str=length_str,
-        language=language,
-        tone=tone,
-        examples_section=examples_section
-    )
+    with span("prompt_render"):
+        fields = dict(tag=tag, length_str=length_str, language=language, tone=tone)
+        base_tokens = count_tokens(POST_PROMPT.format(examples_section="", **fields))
+        texts = [post['text'] for post in examples]
+        full_tokens = base_tokens + examples_tokens(texts)
+        if texts:
+            texts = fit_examples(
+                texts, budget - base_tokens - count_tokens(EXAMPLES_HEADER), overhead=EXAMPLE_OVERHEAD_TOKENS
+            )
+        examples_section = ""
+        if texts:
+            examples_section = EXAMPLES_HEADER
+            for i, text in enumerate(texts, 1):
+                examples_section += f"Example {i}:\n{text}\n\n"
+        
+        prompt = POST_PROMPT.format(examples_section=examples_section, **fields)
     
-    return prompt
\ No newline at end of file
+    prompt_tokens = base_tokens + examples_tokens(texts)
+    observe("prompt_tokens_saved", max(0, full_tokens - prompt_tokens), TOKEN_BUCKETS)
+    if stats is not None:
+        stats.update(prompt_tokens=prompt_tokens, prompt_tokens_saved=max(0, full_tokens - prompt_tokens))
+    return prompt
+
+def examples_tokens(texts):
+    """Estimated tokens of the examples section built from texts"""
+    if not texts:
+        return 0
+    return count_tokens(EXAMPLES_HEADER) + sum(count_tokens(text) + EXAMPLE_OVERHEAD_TOKENS for text in texts)
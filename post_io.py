@@ -0,0 +1,92 @@
+import itertools
+import json
+import os
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def iter_records(file_path):
+    """Stream records from a JSON array or a JSONL file without loading it whole.
+
+    The format is sniffed from the first non-whitespace character, so both
+    `.json` and `.jsonl` files are accepted whatever their extension.
+    """
+    with open(file_path, "r", encoding="utf-8") as file:
+        first = _peek_first_char(file)
+        if first == "":
+            return
+        if first == "[":
+            yield from _iter_json_array(file)
+        else:
+            # The sniffed character belongs to the first record
+            for line in itertools.chain([first + file.readline()], file):
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def _peek_first_char(file):
+    while True:
+        char = file.read(1)
+        if char == "" or not char.isspace():
+            return char
+
+
+def _iter_json_array(file):
+    """Incrementally decode the items of a JSON array whose '[' was consumed"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    eof = False
+    while True:
+        buffer = buffer.lstrip().lstrip(",").lstrip()
+        if buffer.startswith("]"):
+            return
+        if buffer:
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # A scalar cut at the chunk edge can decode early; read on first
+                if end < len(buffer) or eof:
+                    yield item
+                    buffer = buffer[end:]
+                    continue
+        if eof:
+            raise json.JSONDecodeError("Unterminated JSON array", buffer, 0)
+        chunk = file.read(READ_CHUNK_SIZE)
+        if chunk == "":
+            eof = True
+        buffer += chunk
+
+
+def write_records(file_path, records):
+    """Stream records to disk atomically; `.jsonl` gets one record per line,
+    anything else an indented JSON array written item by item.
+
+    Returns the number of records written.
+    """
+    jsonl = file_path.endswith(".jsonl")
+    tmp_path = file_path + ".tmp"
+    count = 0
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        if not jsonl:
+            file.write("[")
+        for record in records:
+            if jsonl:
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            else:
+                item = json.dumps(record, ensure_ascii=False, indent=4)
+                file.write(("," if count else "") + "\n    " + item.replace("\n", "\n    "))
+            count += 1
+        if not jsonl:
+            file.write("\n]" if count else "]")
+    os.replace(tmp_path, file_path)
+    return count
+
+
+def append_record(file, record):
+    """Append one record to an open JSONL file and flush it"""
+    file.write(json.dumps(record, ensure_ascii=False) + "\n")
+    file.flush()
@@ -0,0 +1,113 @@
+import glob
+import json
+import os
+import sqlite3
+import threading
+import uuid
+
+
+class PostStore:
+    """Saved posts in a single SQLite file, indexed by timestamp and tag.
+
+    Inserts are atomic and get a random unique id, so saves in the same
+    second never overwrite each other. History is read one page at a time.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS posts ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL UNIQUE, "
+                "timestamp TEXT NOT NULL, tag TEXT, data TEXT NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS posts_timestamp ON posts (timestamp, seq)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS posts_tag_timestamp ON posts (tag, timestamp, seq)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def save(self, post_data, post_id=None):
+        """Insert a post and return its id"""
+        post_id = post_id or uuid.uuid4().hex
+        data = {key: value for key, value in post_data.items() if key != "id"}
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO posts (id, timestamp, tag, data) VALUES (?, ?, ?, ?)",
+                (post_id, data.get("timestamp", ""), data.get("tag"), json.dumps(data, ensure_ascii=False)),
+            )
+        return post_id
+
+    def delete(self, post_id):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM posts WHERE id = ?", (post_id,))
+
+    def get(self, post_id):
+        with self.lock:
+            row = self.conn.execute("SELECT id, data FROM posts WHERE id = ?", (post_id,)).fetchone()
+        return self._to_post(row) if row else None
+
+    def list_posts(self, limit=20, offset=0, tag=None):
+        """One page of posts, newest first, optionally for a single tag"""
+        query = "SELECT id, data FROM posts"
+        params = []
+        if tag is not None:
+            query += " WHERE tag = ?"
+            params.append(tag)
+        query += " ORDER BY timestamp DESC, seq DESC LIMIT ? OFFSET ?"
+        params += [limit, offset]
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [self._to_post(row) for row in rows]
+
+    def count(self, tag=None):
+        with self.lock:
+            if tag is None:
+                return self.conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+            return self.conn.execute("SELECT COUNT(*) FROM posts WHERE tag = ?", (tag,)).fetchone()[0]
+
+    def tags(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT DISTINCT tag FROM posts WHERE tag IS NOT NULL ORDER BY tag").fetchall()
+        return [row[0] for row in rows]
+
+    def migrate_json_dir(self, folder):
+        """Import the legacy one-file-per-post JSON history once.
+
+        Files are left in place; each gets an id derived from its filename
+        so a migration interrupted halfway can simply run again.
+        """
+        with self.lock:
+            done = self.conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+        if done:
+            return 0
+        migrated = 0
+        rows = []
+        for file_path in sorted(glob.glob(os.path.join(folder, "*.json"))):
+            try:
+                with open(file_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            if not isinstance(data, dict):
+                continue
+            post_id = "json_" + os.path.splitext(os.path.basename(file_path))[0]
+            rows.append((post_id, data.get("timestamp", ""), data.get("tag"), json.dumps(data, ensure_ascii=False)))
+        with self.lock, self.conn:
+            for row in rows:
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO posts (id, timestamp, tag, data) VALUES (?, ?, ?, ?)", row
+                )
+                migrated += cursor.rowcount
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', '1')")
+        return migrated
+
+    @staticmethod
+    def _to_post(row):
+        post = json.loads(row[1])
+        post["id"] = row[0]
+        return post
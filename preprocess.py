@@ -1,32 +1,331 @@
+import hashlib
 import json
+import os
+from collections import Counter
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.exceptions import OutputParserException
 from llm_helper import llm
+from local_metadata import detect_language, local_metadata
+from metrics import TOKEN_BUCKETS, inc, observe, record_llm_call, span
+from near_dup import CORPUS_DUP_THRESHOLD, NearDuplicateIndex
+from prompt_budget import EXTRACT_TOKEN_BUDGET, count_tokens, truncate_to_tokens
+from tag_unifier import TagUnifier
+from post_io import append_record, iter_records, write_records
+from worker_pool import AdaptiveBatchSize, ThroughputReport, TokenBucket, imap_ordered
 import re
 
-def process_post(raw_file_path, processed_file_path="./data/processed_posts.json"):
-    enriched_posts=[]
-    with open(raw_file_path, "r", encoding="utf-8") as file:
-        posts = json.load(file)
-        for post in posts:
-            metadata=extract_metadata(post['text'])
-            post_with_metadata= post | metadata
-            enriched_posts.append(post_with_metadata)
+# Concurrency and provider quota for metadata extraction, overridable from .env
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "30"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+# Posts per extraction prompt (1 sends each post on its own) and the token budget of one batch
+EXTRACT_BATCH_SIZE = int(os.getenv("EXTRACT_BATCH_SIZE", "8"))
+EXTRACT_BATCH_TOKEN_BUDGET = int(os.getenv("EXTRACT_BATCH_TOKEN_BUDGET", "3000"))
+
+METADATA_KEYS = ("line_count", "language", "tags")
+STREAM_CHUNK_SIZE = 256
+
+# Prompt templates are compiled once at import, not per post
+UNIFY_TAGS_PROMPT = PromptTemplate.from_template('''I will give you a list of tags. You need to unify tags with the following requirements,
+    1. Tags are unified and merged to create a shorter list. 
+       Example 1: "Jobseekers", "Job Hunting" can be all merged into a single tag "Job Search". 
+       Example 2: "Motivation", "Inspiration", "Drive" can be mapped to "Motivation"
+       Example 3: "Personal Growth", "Personal Development", "Self Improvement" can be mapped to "Self Improvement"
+       Example 4: "Scam Alert", "Job Scam" etc. can be mapped to "Scams"
+    2. Each tag should be follow title case convention. example: "Motivation", "Job Search"
+    3. Output should be a JSON object, No preamble
+    3. Output should have mapping of original tag and the unified tag. 
+       For example: {{"Jobseekers": "Job Search",  "Job Hunting": "Job Search", "Motivation": "Motivation}}
     
-    unified_tags=get_unified_tags(enriched_posts)
-    for post in enriched_posts:
-        current_tags=post['tags'] 
-        new_tags={unified_tags[tag] for tag in current_tags if tag in unified_tags}
-        post['tags']=list(new_tags)
+    Here is the list of tags: 
+    {tags}
+    ''')
+
+METADATA_PROMPT = PromptTemplate.from_template('''
+        You are given a LinkedIn post. You need to extract number of lines, language of the post and tags.
+        1. Return a valid JSON. No preamble. 
+        2. JSON object should have exactly three keys: line_count, language and tags. 
+        3. tags is an array of text tags. Extract maximum two tags.
+        4. Language should be English or Hinglish (Hinglish means hindi + english)
+        
+        Here is the actual post on which you need to perform this task:  
+        {post}
+    ''')
+
+# Used when line count and language were already worked out locally
+TAGS_PROMPT = PromptTemplate.from_template('''
+        You are given a LinkedIn post. You need to extract up to two topic tags.
+        1. Return a valid JSON. No preamble. 
+        2. JSON object should have exactly one key: tags, an array of text tags.
+        
+        Here is the actual post on which you need to perform this task:  
+        {post}
+    ''')
+
+# Several posts per prompt, so the instructions are paid for once per batch
+BATCH_TAGS_PROMPT = PromptTemplate.from_template('''
+        You are given {count} LinkedIn posts, each starting with its id. You need to extract up to two topic tags for each post.
+        1. Return a valid JSON. No preamble. 
+        2. JSON should be an array with one object per post, each with exactly two keys: id and tags.
+        3. tags is an array of text tags. Extract maximum two tags.
+        
+        Here are the actual posts on which you need to perform this task:  
+        {posts}
+    ''')
+BATCH_ITEM_OVERHEAD_TOKENS = count_tokens("Post 10:\n\n")
+JSON_ITEM_RE = re.compile(r'\{[^{}]*\}')
+
+LANGUAGES = ("English", "Hinglish")
+
+def process_post(raw_file_path, processed_file_path="./data/processed_posts.json",
+                 max_workers=None, requests_per_minute=None, llm_client=None, incremental=True,
+                 dedup_threshold=None, batch_size=None):
+    """Enrich raw posts with LLM metadata and write them to processed_file_path.
+
+    The pipeline streams: raw posts are read incrementally (JSON array or
+    JSONL), cleaned and enriched by generator stages and written to a JSONL
+    stage file, then a second streaming pass remaps tags into the output
+    (JSONL if the path ends in `.jsonl`, a JSON array otherwise).
+
+    Metadata extraction runs on a bounded worker pool behind a token-bucket
+    rate limiter; output keeps the order of the raw file. In incremental
+    mode posts whose fingerprint is already in the processed output or the
+    checkpoint journal are not sent to the LLM again, every new result is
+    appended to the journal as it completes, and tag unification only runs
+    for tags missing from the saved tag mapping. Near-duplicate posts
+    (estimated similarity of at least `dedup_threshold`, default
+    CORPUS_DUP_THRESHOLD, 0 to keep them all) are dropped before
+    extraction, keeping the first copy. Up to `batch_size` posts
+    (EXTRACT_BATCH_SIZE by default) share one extraction prompt. Returns
+    the ThroughputReport of the extraction stage, counted in posts.
+    """
+    max_workers = max_workers or MAX_CONCURRENCY
+    requests_per_minute = requests_per_minute or REQUESTS_PER_MINUTE
+    dedup_threshold = CORPUS_DUP_THRESHOLD if dedup_threshold is None else dedup_threshold
+    batch_size = batch_size or EXTRACT_BATCH_SIZE
+    journal_path = get_journal_path(processed_file_path)
+    mapping_path = get_tag_mapping_path(processed_file_path)
+    stage_path = os.path.splitext(processed_file_path)[0] + ".stage.jsonl"
+
+    known = {}
+    tag_mapping = {}
+    if incremental:
+        tag_mapping = load_tag_mapping(mapping_path)
+        for fingerprint, metadata in load_processed_metadata(processed_file_path).items():
+            known[fingerprint] = metadata
+            # Tags in the processed output are already unified
+            tag_mapping.update({tag: tag for tag in metadata.get('tags', []) if tag not in tag_mapping})
+        known.update(load_journal(journal_path))
+    elif os.path.exists(journal_path):
+        os.remove(journal_path)
+
+    rate_limiter = TokenBucket.per_minute(requests_per_minute, capacity=max_workers)
+    report = ThroughputReport()
+    report.start()
+    fingerprints = set()
+    raw_tags = Counter()
+    dedup_stats = {"duplicates": 0}
+    with open(journal_path, "a", encoding="utf-8") as journal:
+        posts = clean_posts(iter_records(raw_file_path))
+        if dedup_threshold:
+            posts = drop_near_duplicates(posts, NearDuplicateIndex(dedup_threshold), dedup_stats)
+        enriched = enrich_posts(
+            posts, known, journal,
+            llm_client=llm_client,
+            max_workers=max_workers,
+            rate_limiter=rate_limiter,
+            report=report,
+            batch_size=batch_size,
+        )
+        with open(stage_path, "w", encoding="utf-8") as stage:
+            for fingerprint, post in enriched:
+                fingerprints.add(fingerprint)
+                raw_tags.update(post.get('tags', []))
+                append_record(stage, post)
+    report.stop()
+    if dedup_threshold:
+        print(f"Near-duplicates dropped: {dedup_stats['duplicates']}")
+    print(f"Metadata extraction: {report}")
 
-    # clean enriched posts to remove any surrogate pairs
-    for post in enriched_posts:
+    if any(tag not in tag_mapping for tag in raw_tags):
+        unifier = TagUnifier(
+            lambda tags: unify_tags(tags, llm_client=llm_client), tag_mapping,
+            max_workers=max_workers, rate_limiter=rate_limiter, retries=MAX_RETRIES,
+        )
+        unifier.unify(raw_tags)
+        tag_mapping = unifier.mapping
+        save_tag_mapping(mapping_path, tag_mapping)
+        print(f"Tag unification: {unifier.stats}")
+
+    write_records(processed_file_path, remap_tags(iter_records(stage_path), tag_mapping))
+    os.remove(stage_path)
+    compact_journal(journal_path, fingerprints)
+
+    return report
+
+def clean_posts(posts):
+    """Stage: strip surrogate pairs from post text"""
+    for post in posts:
         if 'text' in post:
             post['text'] = clean_surrogates(post['text'])
+        yield post
+
+def drop_near_duplicates(posts, index, stats):
+    """Stage: skip posts that nearly repeat an earlier one, counting them in stats"""
+    for i, post in enumerate(posts):
+        if index.find_or_add(i, post.get('text') or "") is not None:
+            stats["duplicates"] += 1
+            continue
+        yield post
+
+def enrich_posts(posts, known, journal, llm_client=None, max_workers=MAX_CONCURRENCY,
+                 rate_limiter=None, report=None, chunk_size=STREAM_CHUNK_SIZE,
+                 batch_size=EXTRACT_BATCH_SIZE):
+    """Stage: yield (fingerprint, post with metadata) in input order.
+
+    Posts are taken in chunks of `chunk_size`; only the ones missing from
+    `known` are sent to the LLM, packed into batches of up to `batch_size`
+    posts whose size adapts to the failure rate, and each new result is
+    checkpointed to the journal before it is yielded. `report` counts
+    posts that got metadata as items and the others as failures.
+    """
+    sizer = AdaptiveBatchSize(batch_size)
+    for chunk in iter_chunks(posts, chunk_size):
+        fingerprints = [fingerprint_post(post['text']) for post in chunk]
+        pending = [(fp, post['text']) for fp, post in zip(fingerprints, chunk) if fp not in known]
+        results = imap_ordered(
+            lambda batch: list(zip(
+                [fingerprint for fingerprint, _ in batch],
+                extract_metadata_batches([text for _, text in batch], llm_client, sizer, rate_limiter),
+            )),
+            pack_batches(pending, sizer),
+            max_workers=max_workers,
+            rate_limiter=rate_limiter,
+            retries=MAX_RETRIES,
+            report=report,
+            # The report counts posts: those that got metadata, or the whole batch as failed
+            weight=lambda batch, pairs: (
+                len(batch) if pairs is None else sum(1 for _, metadata in pairs if metadata)
+            ),
+        )
+        for batch in results:
+            for fingerprint, metadata in batch:
+                known[fingerprint] = metadata
+                if metadata:
+                    # Failed extractions are not checkpointed so the next run retries them
+                    append_record(journal, {"fingerprint": fingerprint, "metadata": metadata})
+                elif report is not None:
+                    report.record_failure()
+        for fingerprint, post in zip(fingerprints, chunk):
+            yield fingerprint, post | known[fingerprint]
+
+def pack_batches(items, sizer, budget=EXTRACT_BATCH_TOKEN_BUDGET):
+    """Stage: group (fingerprint, text) items into batches for one extraction prompt.
+
+    A batch holds up to `sizer.size` posts (read as each batch starts) and
+    `budget` tokens of post text. Posts whose language is not settled
+    locally go alone, since they need the full metadata prompt.
+    """
+    batch = []
+    used = 0
+    for fingerprint, text in items:
+        if "language" not in local_metadata(clean_surrogates(text)):
+            yield [(fingerprint, text)]
+            continue
+        cost = count_tokens(truncate_to_tokens(clean_surrogates(text), EXTRACT_TOKEN_BUDGET)[0])
+        cost += BATCH_ITEM_OVERHEAD_TOKENS
+        if batch and (len(batch) >= sizer.size or used + cost > budget):
+            yield batch
+            batch = []
+            used = 0
+        batch.append((fingerprint, text))
+        used += cost
+    if batch:
+        yield batch
+
+def remap_tags(posts, tag_mapping):
+    """Stage: replace raw tags with their unified tags"""
+    for post in posts:
+        current_tags=post.get('tags', [])
+        new_tags={tag_mapping[tag] for tag in current_tags if tag in tag_mapping}
+        post['tags']=list(new_tags)
+        yield post
+
+def iter_chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def fingerprint_post(text):
+    """Stable fingerprint of a post's text, used to skip already processed posts"""
+    return hashlib.sha256(clean_surrogates(text).encode("utf-8")).hexdigest()
 
-    with open(processed_file_path, "w", encoding="utf-8") as file:
-        json.dump(enriched_posts, file, ensure_ascii=False, indent=4)
+def get_journal_path(processed_file_path):
+    return os.path.splitext(processed_file_path)[0] + ".journal.jsonl"
+
+def get_tag_mapping_path(processed_file_path):
+    return os.path.join(os.path.dirname(processed_file_path) or ".", "tag_mapping.json")
+
+def load_journal(journal_path):
+    """Read checkpointed metadata keyed by fingerprint, tolerating a torn last line"""
+    checkpoints = {}
+    if not os.path.exists(journal_path):
+        return checkpoints
+    with open(journal_path, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            checkpoints[entry["fingerprint"]] = entry["metadata"]
+    return checkpoints
+
+def compact_journal(journal_path, fingerprints):
+    """Drop journal entries for posts no longer in the raw corpus"""
+    checkpoints = load_journal(journal_path)
+    write_records(journal_path, (
+        {"fingerprint": fp, "metadata": metadata}
+        for fp, metadata in checkpoints.items() if fp in fingerprints
+    ))
+
+def load_processed_metadata(processed_file_path):
+    """Metadata of an existing processed output keyed by post fingerprint.
+
+    Posts whose extraction failed are written without line_count and
+    language; they are left out so the next run retries them.
+    """
+    if not os.path.exists(processed_file_path):
+        return {}
+    try:
+        return {
+            fingerprint_post(post['text']): {key: post[key] for key in METADATA_KEYS}
+            for post in iter_records(processed_file_path)
+            if 'text' in post and all(key in post for key in METADATA_KEYS)
+        }
+    except json.JSONDecodeError:
+        return {}
+
+def load_tag_mapping(mapping_path):
+    if not os.path.exists(mapping_path):
+        return {}
+    with open(mapping_path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+def save_tag_mapping(mapping_path, tag_mapping):
+    write_atomic_json(mapping_path, dict(sorted(tag_mapping.items())))
+
+def write_atomic_json(file_path, data):
+    """Write JSON via a temp file so readers never see a half-written file"""
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(data, file, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, file_path)
 
 def extract_json_from_response(response_text):
         # Find the first {...} JSON object in the string
@@ -36,79 +335,221 @@ def extract_json_from_response(response_text):
         else:
             return None
      
-def get_unified_tags(posts_with_metadata):
-    unique_tags=set()
+def get_unified_tags(posts_with_metadata, llm_client=None):
+    tag_counts=Counter()
     for post in posts_with_metadata:
-        unique_tags.update(post['tags'])
-    unique_tags_list=', '.join(unique_tags)
+        tag_counts.update(post.get('tags', []))
+    unifier=TagUnifier(lambda tags: unify_tags(tags, llm_client=llm_client), retries=MAX_RETRIES)
+    return unifier.unify(tag_counts)
 
-    template = '''I will give you a list of tags. You need to unify tags with the following requirements,
-    1. Tags are unified and merged to create a shorter list. 
-       Example 1: "Jobseekers", "Job Hunting" can be all merged into a single tag "Job Search". 
-       Example 2: "Motivation", "Inspiration", "Drive" can be mapped to "Motivation"
-       Example 3: "Personal Growth", "Personal Development", "Self Improvement" can be mapped to "Self Improvement"
-       Example 4: "Scam Alert", "Job Scam" etc. can be mapped to "Scams"
-    2. Each tag should be follow title case convention. example: "Motivation", "Job Search"
-    3. Output should be a JSON object, No preamble
-    3. Output should have mapping of original tag and the unified tag. 
-       For example: {{"Jobseekers": "Job Search",  "Job Hunting": "Job Search", "Motivation": "Motivation}}
-    
-    Here is the list of tags: 
-    {tags}
-    '''
+def unify_tags(tags, llm_client=None):
+    """Ask the LLM to map each tag to a unified tag (one bounded chunk of tags)"""
+    llm_client = llm_client or llm
+    unique_tags_list=', '.join(tags)
 
-    pt= PromptTemplate.from_template(template)
-    chain= pt | llm
     # Clean unique tags to remove any surrogate pairs
     unique_tags_list = clean_surrogates(unique_tags_list)
-    # Invoke the chain with the unique tags
-    response=chain.invoke(input={'tags': unique_tags_list})
+    # Invoke the LLM with the rendered prompt
+    prompt=UNIFY_TAGS_PROMPT.format(tags=unique_tags_list)
+    try:
+        with span("llm_call", operation="unify_tags"):
+            response=llm_client.invoke(prompt)
+    except Exception:
+        inc("llm_errors_total", operation="unify_tags")
+        raise
+    record_llm_call("unify_tags", prompt, response.content, getattr(response, "usage_metadata", None))
 
     try:
-        json_parser = JsonOutputParser()
-        response_text = response.content
-        json_str = extract_json_from_response(response_text)
-        if json_str:
-            output = json_parser.parse(json_str)
+        with span("parse", operation="unify_tags"):
+            json_parser = JsonOutputParser()
+            response_text = response.content
+            json_str = extract_json_from_response(response_text)
+            output = json_parser.parse(json_str) if json_str else None
+        if output is not None:
             return output
         else:
+            inc("parse_failures_total", operation="unify_tags")
             print("No JSON found in LLM response.")
+            forget_response(llm_client, prompt)
             return {}
     except OutputParserException as e:
+        inc("parse_failures_total", operation="unify_tags")
         print(f"Error parsing output: {e}")
+        forget_response(llm_client, prompt)
         return {}
 
+def forget_response(llm_client, prompt):
+    """Drop an unusable response from the LLM cache so a retry reaches the model"""
+    invalidate = getattr(llm_client, "invalidate", None)
+    if invalidate is not None:
+        invalidate(prompt)
+
 def clean_surrogates(text):
     # Remove surrogate pairs (invalid in UTF-8)
     return re.sub(r'[\ud800-\udfff]', '', text)
 
-def extract_metadata(post):
-    template = '''
-        You are given a LinkedIn post. You need to extract number of lines, language of the post and tags.
-        1. Return a valid JSON. No preamble. 
-        2. JSON object should have exactly three keys: line_count, language and tags. 
-        3. tags is an array of text tags. Extract maximum two tags.
-        4. Language should be English or Hinglish (Hinglish means hindi + english)
-        
-        Here is the actual post on which you need to perform this task:  
-        {post}
-    '''
-    
-    pt= PromptTemplate.from_template(template)
-    chain= pt | llm
+def extract_metadata(post, llm_client=None, budget=None, bypass_cache=False):
+    """Line count, language and tags of a post.
+
+    Line count and language are computed locally; the LLM is only asked
+    for tags, or also for the language when the local guess is below
+    LANGUAGE_CONFIDENCE. Posts over `budget` tokens (EXTRACT_TOKEN_BUDGET
+    by default) are sent as their leading lines only. A response that
+    cannot be used is dropped from the LLM cache, so a later retry (in this
+    run or the next) asks the model again; `bypass_cache=True` skips the
+    cache lookup outright.
+    """
+    llm_client = llm_client or llm
+    budget = EXTRACT_TOKEN_BUDGET if budget is None else budget
 
     # Clean post text to remove any surrogate pairs
     post = clean_surrogates(post)
-    # Invoke the chain with the post
-    response=chain.invoke(input={'post': post})
+    metadata = local_metadata(post)
+    escalate = "language" not in metadata
+    inc("metadata_language_total", source="llm" if escalate else "local")
+    excerpt, truncated = truncate_to_tokens(post, budget)
+    if truncated:
+        observe("prompt_tokens_saved", count_tokens(post) - count_tokens(excerpt), TOKEN_BUCKETS)
+    # Invoke the LLM with the rendered prompt
+    prompt=(METADATA_PROMPT if escalate else TAGS_PROMPT).format(post=excerpt)
+    try:
+        with span("llm_call", operation="extract_metadata"):
+            response=llm_client.invoke(prompt, bypass_cache=bypass_cache)
+    except Exception:
+        inc("llm_errors_total", operation="extract_metadata")
+        raise
+    record_llm_call("extract_metadata", prompt, response.content, getattr(response, "usage_metadata", None))
 
     json_parser=JsonOutputParser()
     try:
-        output=json_parser.parse(response.content)
-        return output
+        with span("parse", operation="extract_metadata"):
+            output=json_parser.parse(response.content)
     except OutputParserException as e:
+        inc("parse_failures_total", operation="extract_metadata")
         print(f"Error parsing output: {e}")
+        forget_response(llm_client, prompt)
         return {}
+    tags = output.get("tags") if isinstance(output, dict) else output
+    if not isinstance(tags, list):
+        inc("parse_failures_total", operation="extract_metadata")
+        print(f"No tags in LLM response: {response.content!r}")
+        forget_response(llm_client, prompt)
+        return {}
+    if escalate:
+        language = output.get("language") if isinstance(output, dict) else None
+        # An unexpected answer falls back to the local guess
+        metadata["language"] = language if language in LANGUAGES else detect_language(post)[0]
+    metadata["tags"] = clean_tags(tags)
+    return metadata
+
+def clean_tags(tags):
+    return [tag for tag in tags if isinstance(tag, str) and tag.strip()][:2]
+
+def extract_metadata_batches(posts, llm_client=None, sizer=None, rate_limiter=None):
+    """Metadata for each post, asking for several posts' tags per prompt.
+
+    Posts missing or malformed in a batch response are sent again as a
+    smaller batch of just those posts (up to MAX_RETRIES times); a lone
+    post goes through extract_metadata. Each batch's failures are reported
+    to `sizer`. The first request is paid for by the caller's rate limiter
+    slot, later ones wait on `rate_limiter`. Retries bypass the LLM cache.
+    Failed posts get {}.
+    """
+    results = [{}] * len(posts)
+    todo = list(range(len(posts)))
+    for attempt in range(MAX_RETRIES + 1):
+        if not todo:
+            break
+        if attempt and rate_limiter is not None:
+            rate_limiter.acquire()
+        if len(todo) == 1:
+            results[todo[0]] = extract_metadata(posts[todo[0]], llm_client=llm_client, bypass_cache=attempt > 0)
+            break
+        batch = extract_metadata_batch([posts[i] for i in todo], llm_client=llm_client, bypass_cache=attempt > 0)
+        failed = [i for i, metadata in zip(todo, batch) if metadata is None]
+        for i, metadata in zip(todo, batch):
+            if metadata is not None:
+                results[i] = metadata
+        if sizer is not None:
+            sizer.record(len(todo), len(failed))
+        todo = failed
+    return results
+
+def extract_metadata_batch(posts, llm_client=None, budget=None, bypass_cache=False):
+    """One LLM call for the tags of several posts; None for posts missing from the response.
+
+    Line count and language are computed locally as in extract_metadata.
+    A response with missing or malformed posts is dropped from the LLM
+    cache, so it is never replayed for the same batch.
+    """
+    llm_client = llm_client or llm
+    budget = EXTRACT_TOKEN_BUDGET if budget is None else budget
+
+    posts = [clean_surrogates(post) for post in posts]
+    sections = []
+    for i, post in enumerate(posts, 1):
+        excerpt, truncated = truncate_to_tokens(post, budget)
+        if truncated:
+            observe("prompt_tokens_saved", count_tokens(post) - count_tokens(excerpt), TOKEN_BUCKETS)
+        sections.append(f"Post {i}:\n{excerpt}")
+    prompt = BATCH_TAGS_PROMPT.format(count=len(posts), posts="\n\n".join(sections))
+    try:
+        with span("llm_call", operation="extract_metadata_batch"):
+            response = llm_client.invoke(prompt, bypass_cache=bypass_cache)
+    except Exception:
+        inc("llm_errors_total", operation="extract_metadata_batch")
+        raise
+    record_llm_call("extract_metadata_batch", prompt, response.content, getattr(response, "usage_metadata", None))
+
+    with span("parse", operation="extract_metadata_batch"):
+        tags_by_id = parse_batch_response(response.content)
+    results = []
+    for i, post in enumerate(posts, 1):
+        tags = tags_by_id.get(str(i))
+        if tags is None:
+            results.append(None)
+            continue
+        metadata = local_metadata(post, min_confidence=0)
+        metadata["tags"] = tags
+        results.append(metadata)
+    failed = results.count(None)
+    inc("extract_batch_items_total", len(posts) - failed, result="ok")
+    if failed:
+        inc("extract_batch_items_total", failed, result="failed")
+        inc("parse_failures_total", operation="extract_metadata_batch")
+        print(f"{failed} of {len(posts)} posts missing from batch response")
+        forget_response(llm_client, prompt)
+    return results
+
+def parse_batch_response(response_text):
+    """Tags by post id from a batch response, skipping malformed items.
+
+    The whole response is parsed as JSON first; if that fails, each
+    {...} object in it is parsed on its own so one broken item does not
+    lose the rest.
+    """
+    json_parser = JsonOutputParser()
+    try:
+        items = json_parser.parse(response_text)
+    except OutputParserException:
+        items = None
+    if isinstance(items, dict):
+        # Also accept a wrapping object or an object keyed by id
+        wrapped = [value for value in items.values() if isinstance(value, list) and value and isinstance(value[0], dict)]
+        items = wrapped[0] if wrapped else [{"id": key, "tags": value} for key, value in items.items()]
+    if not isinstance(items, list):
+        items = []
+        for match in JSON_ITEM_RE.finditer(response_text):
+            try:
+                items.append(json_parser.parse(match.group(0)))
+            except OutputParserException:
+                continue
+    tags_by_id = {}
+    for item in items:
+        if isinstance(item, dict) and "id" in item and isinstance(item.get("tags"), list):
+            tags_by_id[str(item["id"]).strip()] = clean_tags(item["tags"])
+    return tags_by_id
 
 if __name__=="__main__":
-    process_post("./data/raw_post.json", "./data/processed_posts.json")
+    report = process_post("./data/raw_post.json", "./data/processed_posts.json")
+    print(report.summary())
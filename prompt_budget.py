@@ -0,0 +1,86 @@
+"""Local token estimates and budget-aware trimming of prompt content.
+
+Counts are an approximation of a BPE tokenizer, close enough to size
+prompts without calling the provider: short ASCII words and punctuation
+marks are one token each, long words one per ~6 characters, and other
+scripts and emoji one per character.
+"""
+import os
+import re
+from functools import lru_cache
+
+# Whole-prompt budget for post generation and the per-post cap for metadata extraction
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1200"))
+EXTRACT_TOKEN_BUDGET = int(os.getenv("EXTRACT_TOKEN_BUDGET", "1000"))
+# An example trimmed below this is dropped in favour of the more relevant ones
+MIN_EXAMPLE_TOKENS = int(os.getenv("MIN_EXAMPLE_TOKENS", "40"))
+
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9_']+|[^\sA-Za-z0-9_']")
+LONG_WORD_PATTERN = re.compile(r"[A-Za-z0-9_']{7,}")
+ELLIPSIS = "…"
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text):
+    """Approximate token count of `text` (cached: examples and templates repeat)"""
+    if not text:
+        return 0
+    return len(TOKEN_PATTERN.findall(text)) + sum(
+        (len(word) - 1) // 6 for word in LONG_WORD_PATTERN.findall(text)
+    )
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Keep the leading lines of `text` that fit in max_tokens.
+
+    A first line that does not fit on its own is cut at a word boundary.
+    Returns (text, truncated).
+    """
+    if count_tokens(text) <= max_tokens:
+        return text, False
+    budget = max_tokens - 1  # room for the ellipsis
+    kept = []
+    used = 0
+    for line in text.split("\n"):
+        cost = count_tokens(line) + 1
+        if used + cost > budget:
+            if not kept:
+                words = []
+                for word in line.split(" "):
+                    used += count_tokens(word)
+                    if used > budget:
+                        break
+                    words.append(word)
+                kept.append(" ".join(words))
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept).rstrip() + ELLIPSIS, True
+
+
+def fit_examples(texts, budget, overhead=0, min_tokens=MIN_EXAMPLE_TOKENS):
+    """Fit example texts, most relevant first, into `budget` tokens.
+
+    Each example costs its tokens plus `overhead` (its heading). Short
+    examples are kept whole and their unused share goes to the longer
+    ones, which are trimmed to their leading lines; when a share would
+    fall below `min_tokens` the least relevant example is dropped instead.
+    Returns the fitted texts in their original order.
+    """
+    texts = list(texts)
+    costs = [count_tokens(text) for text in texts]
+    while texts:
+        left = budget - overhead * len(texts)
+        shares = {}
+        order = sorted(range(len(texts)), key=lambda i: costs[i])
+        for k, i in enumerate(order):
+            shares[i] = min(costs[i], left // (len(texts) - k))
+            left -= shares[i]
+        if all(shares[i] >= costs[i] or shares[i] >= min_tokens for i in shares):
+            return [
+                text if shares[i] >= costs[i] else truncate_to_tokens(text, shares[i])[0]
+                for i, text in enumerate(texts)
+            ]
+        texts.pop()
+        costs.pop()
+    return []
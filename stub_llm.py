@@ -0,0 +1,214 @@
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubResponse:
+    """Minimal stand-in for a LangChain AIMessage"""
+
+    def __init__(self, content):
+        self.content = content
+
+    def __repr__(self):
+        return f"StubResponse(content={self.content!r})"
+
+
+def prompt_to_text(prompt):
+    """Render a prompt (str, PromptValue or message list) as plain text"""
+    if isinstance(prompt, str):
+        return prompt
+    if hasattr(prompt, "to_string"):
+        return prompt.to_string()
+    if isinstance(prompt, list):
+        return "\n".join(getattr(message, "content", str(message)) for message in prompt)
+    return str(prompt)
+
+
+def default_responder(prompt):
+    """Produce a plausible answer for the prompts used in this app"""
+    if "extract up to two topic tags for each post" in prompt:
+        ids = re.findall(r"^\s*Post (\d+):", prompt, re.MULTILINE)
+        return json.dumps([{"id": int(i), "tags": ["Job Search"]} for i in ids])
+    if "extract up to two topic tags" in prompt:
+        return json.dumps({"tags": ["Job Search"]})
+    if "extract number of lines" in prompt:
+        post = prompt.split("perform this task:", 1)[-1].strip()
+        return json.dumps({
+            "line_count": max(1, post.count("\n") + 1),
+            "language": "English",
+            "tags": ["Job Search"],
+        })
+    if "unify tags" in prompt:
+        tags = prompt.split("Here is the list of tags:", 1)[-1].strip()
+        mapping = {tag.strip(): tag.strip().title() for tag in tags.split(",") if tag.strip()}
+        return json.dumps(mapping)
+    topic = re.search(r"Topic: (.*)", prompt)
+    topic = topic.group(1).strip() if topic else "work"
+    return (
+        "<think>Drafting a post about the requested topic.</think>\n"
+        f"A few honest thoughts on {topic} 🚀\n"
+        "Show up, keep learning, and help someone else along the way.\n"
+        f"#{topic.replace(' ', '')}"
+    )
+
+
+class StubLLM:
+    """Local stub for llm_helper.llm with configurable latency and failures.
+
+    `responder` maps the rendered prompt text to the completion text.
+    `failure_rate` makes that fraction of calls raise ConnectionError, which
+    callers treat as a transient error. `stream` yields the completion in
+    small chunks, `token_latency` seconds apart, after the initial latency.
+    """
+
+    def __init__(self, responder=None, latency=0.0, jitter=0.0, failure_rate=0.0, seed=None,
+                 token_latency=0.0):
+        self.responder = responder or default_responder
+        self.token_latency = token_latency
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def invoke(self, prompt, **kwargs):
+        with self.lock:
+            self.calls += 1
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = self.failure_rate and self.random.random() < self.failure_rate
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise ConnectionError("stub LLM transient failure")
+        return StubResponse(self.responder(prompt_to_text(prompt)))
+
+    def stream(self, prompt, **kwargs):
+        content = self.invoke(prompt, **kwargs).content
+        for chunk in re.findall(r"\s*\S{1,6}|\s+$", content):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            yield StubResponse(chunk)
+
+
+class StubLLMServer:
+    """Local OpenAI-compatible chat completions endpoint backed by a StubLLM.
+
+    Answers POSTs to any path ending in /chat/completions (the Groq SDK
+    uses /openai/v1/chat/completions), including `"stream": true` as
+    server-sent events. Latency and failures come from the wrapped StubLLM;
+    a failure is returned as HTTP `failure_status`. Point a client at `url`:
+
+        with StubLLMServer(StubLLM(latency=2.0)) as server:
+            ChatGroq(base_url=server.url, api_key="stub", model="stub", max_retries=0)
+    """
+
+    def __init__(self, llm=None, host="127.0.0.1", port=0, failure_status=503):
+        self.llm = llm or StubLLM()
+        self.failure_status = failure_status
+        self.requests = 0
+        self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                stub.requests += 1
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    return self.send_json(404, {"error": {"message": "not found"}})
+                prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+                try:
+                    content = stub.llm.invoke(prompt).content
+                except ConnectionError as e:
+                    return self.send_json(stub.failure_status, {"error": {"message": str(e), "type": "stub_error"}})
+                model = body.get("model", "stub")
+                usage = {
+                    "prompt_tokens": max(1, len(prompt) // 4),
+                    "completion_tokens": max(1, len(content) // 4),
+                }
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+                if body.get("stream"):
+                    return self.send_stream(model, content, usage)
+                self.send_json(200, {
+                    "id": f"stub-{stub.requests}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": usage,
+                })
+
+            def send_json(self, status, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_stream(self, model, content, usage):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                pieces = re.findall(r"\s*\S{1,6}|\s+$", content)
+                for i, piece in enumerate(pieces):
+                    if stub.llm.token_latency:
+                        time.sleep(stub.llm.token_latency)
+                    last = i == len(pieces) - 1
+                    chunk = {
+                        "id": f"stub-{stub.requests}",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{
+                            "index": 0,
+                            "delta": {"content": piece},
+                            "finish_reason": "stop" if last else None,
+                        }],
+                    }
+                    if last:
+                        chunk["x_groq"] = {"usage": usage}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
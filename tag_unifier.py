@@ -0,0 +1,167 @@
+import os
+import re
+import string
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+from worker_pool import run_ordered
+
+# Representatives sent to the LLM per prompt, and known tags offered as targets
+CHUNK_SIZE = int(os.getenv("TAG_UNIFY_CHUNK_SIZE", "150"))
+MAX_HINT_TAGS = 100
+
+TOKEN_OVERLAP_THRESHOLD = 0.8
+SIMILARITY_THRESHOLD = 0.9
+# Tokens shared by more tags than this are too common to suggest a duplicate
+MAX_BLOCK_SIZE = 50
+
+
+def normalize_tag(tag):
+    """Case/whitespace/punctuation-insensitive form of a tag with naive singulars"""
+    tag = re.sub(r"(?<=[a-z])(?=[A-Z])", " ", tag)
+    tag = re.sub(r"[\W_]+", " ", tag.casefold()).strip()
+    return " ".join(singular(token) for token in tag.split())
+
+
+def singular(token):
+    if len(token) <= 3:
+        return token
+    if token.endswith("ies"):
+        return token[:-3] + "y"
+    if token.endswith(("ches", "shes", "sses", "xes")):
+        return token[:-2]
+    if token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def cluster_tags(tag_counts):
+    """Group near-duplicate tags locally, without any LLM call.
+
+    Tags with the same normalised form are merged; other pairs merge on
+    high token overlap when they share a token, or on high string
+    similarity when they share a 4-character prefix. Oversized blocks are
+    skipped so the cost stays close to linear. Returns a list of clusters,
+    each a list of tags with the most frequent one first.
+    """
+    by_key = defaultdict(list)
+    for tag in tag_counts:
+        by_key[normalize_tag(tag)].append(tag)
+    keys = list(by_key)
+    parent = list(range(len(keys)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # Shared tokens suggest reordered/extended tags, shared prefixes typos
+    token_blocks = defaultdict(list)
+    prefix_blocks = defaultdict(list)
+    for i, key in enumerate(keys):
+        for token in set(key.split()):
+            token_blocks[token].append(i)
+        prefix_blocks[key[:4]].append(i)
+
+    token_sets = [set(key.split()) for key in keys]
+
+    def overlapping(a, b):
+        union = len(token_sets[a] | token_sets[b]) or 1
+        return len(token_sets[a] & token_sets[b]) / union >= TOKEN_OVERLAP_THRESHOLD
+
+    def similar(a, b):
+        matcher = SequenceMatcher(None, keys[a], keys[b])
+        return (matcher.real_quick_ratio() >= SIMILARITY_THRESHOLD
+                and matcher.quick_ratio() >= SIMILARITY_THRESHOLD
+                and matcher.ratio() >= SIMILARITY_THRESHOLD)
+
+    for blocks, matches in ((token_blocks, overlapping), (prefix_blocks, similar)):
+        for members in blocks.values():
+            if len(members) < 2 or len(members) > MAX_BLOCK_SIZE:
+                continue
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    a, b = members[x], members[y]
+                    if find(a) != find(b) and matches(a, b):
+                        parent[find(a)] = find(b)
+
+    clusters = defaultdict(list)
+    for i, key in enumerate(keys):
+        clusters[find(i)].extend(by_key[key])
+    return [
+        sorted(tags, key=lambda tag: (-tag_counts[tag], len(tag), tag))
+        for tags in clusters.values()
+    ]
+
+
+class TagUnifier:
+    """Staged tag unification backed by a persistent tag -> unified tag dictionary.
+
+    Only tags missing from `mapping` are unified: first against known tags
+    by normalised form, then by local clustering, and finally the cluster
+    representatives go to `llm_unify` in chunks of `chunk_size`, in
+    parallel, with the partial mappings merged. A representative the LLM
+    leaves out maps to its own title-cased form.
+    """
+
+    def __init__(self, llm_unify, mapping=None, chunk_size=CHUNK_SIZE, max_workers=4,
+                 rate_limiter=None, retries=3):
+        self.llm_unify = llm_unify
+        self.mapping = dict(mapping or {})
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter
+        self.retries = retries
+        self.stats = {}
+
+    def unify(self, tag_counts):
+        """Map every tag in tag_counts (a Counter or iterable) to its unified tag"""
+        tag_counts = tag_counts if isinstance(tag_counts, Counter) else Counter(tag_counts)
+        new_tags = Counter({tag: count for tag, count in tag_counts.items() if tag not in self.mapping})
+
+        canonical = {normalize_tag(value): value for value in self.mapping.values()}
+        known = {normalize_tag(tag): value for tag, value in self.mapping.items()}
+        known.update(canonical)
+        matched = 0
+        for tag in list(new_tags):
+            value = known.get(normalize_tag(tag))
+            if value is not None:
+                self.mapping[tag] = value
+                del new_tags[tag]
+                matched += 1
+
+        clusters = cluster_tags(new_tags)
+        representatives = [cluster[0] for cluster in clusters]
+        chunks = [
+            representatives[i:i + self.chunk_size]
+            for i in range(0, len(representatives), self.chunk_size)
+        ]
+        hints = sorted(set(self.mapping.values()), key=lambda tag: -tag_counts.get(tag, 0))[:MAX_HINT_TAGS]
+        partials = run_ordered(
+            lambda chunk: self.llm_unify(chunk + [tag for tag in hints if tag not in chunk]),
+            chunks,
+            max_workers=self.max_workers,
+            rate_limiter=self.rate_limiter,
+            retries=self.retries,
+        ) if chunks else []
+
+        unified = {}
+        for partial in partials:
+            unified.update(partial or {})
+        for cluster in clusters:
+            value = unified.get(cluster[0])
+            if not isinstance(value, str) or not value.strip():
+                value = string.capwords(cluster[0])
+            # Different chunks may spell the same unified tag differently
+            value = canonical.setdefault(normalize_tag(value), value)
+            for tag in cluster:
+                self.mapping[tag] = value
+
+        self.stats = {
+            "new_tags": matched + sum(len(cluster) for cluster in clusters),
+            "matched_known": matched,
+            "local_clusters": len(clusters),
+            "llm_chunks": len(chunks),
+        }
+        return {tag: self.mapping[tag] for tag in tag_counts if tag in self.mapping}
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Modules live at the repository root; tests never reach the real API or the on-disk cache
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GROQ_API_KEY", "tests-offline")
+os.environ.setdefault("LLM_CACHE_ENABLED", "0")
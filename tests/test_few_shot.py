@@ -0,0 +1,55 @@
+import json
+import os
+
+from few_shot import FewShotPosts, snapshot_path
+
+POSTS = [
+    {"text": "Got the offer after 40 rejections", "engagement": 900, "line_count": 1,
+     "language": "English", "tags": ["Job Search", "Motivation"], "source": "feed"},
+    {"text": "Naukri dhundhna bahut mushkil hai yaar\nPar haar nahi maanni", "engagement": 120, "line_count": 2,
+     "language": "Hinglish", "tags": ["Job Search", "Job Search"], "source": "feed"},
+    {"text": "Fake recruiters asking for a \"training fee\" 🚩", "engagement": 45.5, "line_count": 1,
+     "language": "English", "tags": ["Scams"], "source": "dm"},
+    {"text": "Weekly wins: shipped, slept, repeated", "engagement": 300, "line_count": 6,
+     "language": "English", "tags": ["Motivation"], "source": "feed"},
+]
+
+
+def write_posts(tmp_path, posts=POSTS):
+    path = tmp_path / "processed_posts.json"
+    path.write_text(json.dumps(posts), encoding="utf-8")
+    return str(path)
+
+
+def test_snapshot_matches_cold_load(tmp_path):
+    path = write_posts(tmp_path)
+    cold = FewShotPosts(path, use_snapshot=False)
+    FewShotPosts(path)
+    snapshot = FewShotPosts(path)
+
+    assert os.path.isdir(snapshot_path(path))
+    assert list(snapshot.records) == cold.records
+    assert snapshot.unique_tags == cold.unique_tags
+    assert snapshot.tag_categories == cold.tag_categories
+    for key in cold.index:
+        assert snapshot.get_filtered_posts(*key, limit=10) == cold.get_filtered_posts(*key, limit=10)
+    requests = [("Short", "English", "Scams", "Casual"), ("Medium", "Hinglish", "Job Search", "Professional")]
+    assert snapshot.get_similar_posts_batch(requests) == cold.get_similar_posts_batch(requests)
+
+
+def test_repeated_tag_indexes_post_once(tmp_path):
+    corpus = FewShotPosts(write_posts(tmp_path), use_snapshot=False)
+
+    posts = corpus.get_filtered_posts("Short", "Hinglish", "Job Search", limit=10)
+    assert [post["engagement"] for post in posts] == [120]
+    assert list(corpus.tag_rows["Job Search"]) == [0, 1]
+
+
+def test_changed_source_rewrites_snapshot(tmp_path):
+    path = write_posts(tmp_path)
+    FewShotPosts(path)
+    write_posts(tmp_path, POSTS[:2])
+
+    corpus = FewShotPosts(path)
+    assert len(corpus.records) == 2
+    assert len(FewShotPosts(path).records) == 2
@@ -0,0 +1,38 @@
+from llm_cache import CachedLLM, ResponseCache
+from stub_llm import StubLLM
+
+
+def test_invalidate_sends_next_call_to_the_model(tmp_path):
+    stub = StubLLM(responder=lambda prompt: "not json")
+    llm = CachedLLM(stub, ResponseCache(str(tmp_path / "cache.sqlite3")))
+
+    llm.invoke("prompt")
+    llm.invoke("prompt")
+    assert stub.calls == 1
+
+    llm.invalidate("prompt")
+    llm.invoke("prompt")
+    assert stub.calls == 2
+
+
+def test_delete_removes_entry_from_memory_and_disk(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache(path)
+    cache.put("key", "value")
+    cache.delete("key")
+
+    assert cache.get("key") is None
+    assert ResponseCache(path).get("key") is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_memory_hits_protect_entries_from_eviction(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), max_bytes=2500)
+    cache.put("hot", "x" * 1000)
+    cache.put("cold", "y" * 1000)
+    for _ in range(10):
+        assert cache.get("hot") is not None
+
+    cache.put("new", "z" * 1000)
+    assert cache.get("hot") is not None
+    assert cache.get("cold") is None
@@ -0,0 +1,97 @@
+import time
+
+import pytest
+from langchain_groq import ChatGroq
+
+from llm_pool import Backend, LLMPool
+from stub_llm import StubLLM, StubLLMServer
+
+
+def answer(text):
+    return StubLLM(responder=lambda prompt: text)
+
+
+def backend(name, server, **kwargs):
+    client = ChatGroq(base_url=server.url, api_key="stub", model="stub", max_retries=0)
+    return Backend(name, client, **kwargs)
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(llm):
+        server = StubLLMServer(llm).start()
+        started.append(server)
+        return server
+
+    yield start
+    for server in started:
+        server.stop()
+
+
+def test_invoke_fails_over_to_next_backend(servers):
+    down = servers(StubLLM(failure_rate=1.0))
+    up = servers(answer("from up"))
+    pool = LLMPool([backend("down", down), backend("up", up)])
+
+    assert pool.invoke("hello").content == "from up"
+    health = {status["name"]: status for status in pool.health()}
+    assert health["down"]["errors"] == 1
+    assert health["up"]["errors"] == 0
+
+
+def test_stream_fails_over_before_first_chunk(servers):
+    down = servers(StubLLM(failure_rate=1.0))
+    up = servers(answer("streamed from the healthy backend"))
+    pool = LLMPool([backend("down", down), backend("up", up)])
+
+    text = "".join(chunk.content for chunk in pool.stream("hello"))
+    assert text == "streamed from the healthy backend"
+
+
+def test_open_circuit_is_skipped_until_cooldown(servers):
+    down = servers(StubLLM(failure_rate=1.0))
+    up = servers(answer("ok"))
+    pool = LLMPool([backend("down", down, max_failures=2, cooldown=0.5), backend("up", up)])
+
+    pool.invoke("1")
+    pool.invoke("2")
+    assert down.requests == 2
+    assert not pool.backends[0].healthy()
+
+    pool.invoke("3")
+    assert down.requests == 2  # circuit open: straight to the healthy backend
+
+    time.sleep(0.6)
+    pool.invoke("4")
+    assert down.requests == 3  # trial call after the cooldown
+
+
+def test_hedged_request_returns_fast_backend_answer(servers):
+    slow = servers(StubLLM(latency=1.5, responder=lambda prompt: "slow"))
+    fast = servers(StubLLM(latency=0.05, responder=lambda prompt: "fast"))
+    pool = LLMPool([backend("slow", slow), backend("fast", fast)], hedge_after=0.1)
+
+    started = time.perf_counter()
+    assert pool.invoke("hello").content == "fast"
+    assert time.perf_counter() - started < 1.0
+
+
+def test_without_hedging_waits_for_first_backend(servers):
+    slow = servers(StubLLM(latency=0.3, responder=lambda prompt: "slow"))
+    fast = servers(answer("fast"))
+    pool = LLMPool([backend("slow", slow), backend("fast", fast)])
+
+    assert pool.invoke("hello").content == "slow"
+    assert fast.requests == 0
+
+
+def test_last_error_is_raised_when_every_backend_fails(servers):
+    first = servers(StubLLM(failure_rate=1.0))
+    second = servers(StubLLM(failure_rate=1.0))
+    pool = LLMPool([backend("first", first), backend("second", second)])
+
+    with pytest.raises(Exception):
+        pool.invoke("hello")
+    assert first.requests == 1 and second.requests == 1
@@ -0,0 +1,134 @@
+from llm_cache import CachedLLM, ResponseCache
+from post_io import iter_records, write_records
+from preprocess import MAX_RETRIES, extract_metadata_batches, parse_batch_response, process_post
+from stub_llm import StubLLM, default_responder
+from worker_pool import AdaptiveBatchSize
+
+
+def write_raw_posts(path, count=10):
+    write_records(str(path), [
+        {"text": f"Post {i} about careers, interviews and growth {i * 7}\nSecond line {i}", "engagement": i}
+        for i in range(count)
+    ])
+
+
+def run(raw_path, output_path, llm_client, **kwargs):
+    process_post(str(raw_path), str(output_path), llm_client=llm_client, requests_per_minute=1e9,
+                 dedup_threshold=0, **kwargs)
+    return list(iter_records(str(output_path)))
+
+
+def test_failed_posts_are_retried_through_the_cache_on_the_next_run(tmp_path):
+    raw_path = tmp_path / "raw.json"
+    output_path = tmp_path / "processed.json"
+    write_raw_posts(raw_path)
+    answers = {"broken": True}
+    stub = StubLLM(responder=lambda prompt: "not json" if answers["broken"] else default_responder(prompt))
+    llm_client = CachedLLM(stub, ResponseCache(str(tmp_path / "cache.sqlite3")))
+
+    first = run(raw_path, output_path, llm_client, batch_size=1)
+    assert all("language" not in post for post in first)
+
+    answers["broken"] = False
+    calls = stub.calls
+    second = run(raw_path, output_path, llm_client, batch_size=1)
+    assert stub.calls - calls >= 10  # every post reached the model again, plus tag unification
+    assert all(post["language"] == "English" and post["tags"] for post in second)
+
+    calls = stub.calls
+    run(raw_path, output_path, llm_client, batch_size=1)
+    assert stub.calls == calls  # nothing left to retry
+
+
+def flaky_responder(bad_answers):
+    """Answer the first `bad_answers` batch prompts with garbage, then correctly"""
+    state = {"left": bad_answers}
+
+    def respond(prompt):
+        if "for each post" in prompt and state["left"] > 0:
+            state["left"] -= 1
+            return "Sorry, I cannot help with that."
+        return default_responder(prompt)
+
+    return respond
+
+
+def test_batch_retry_reaches_the_model_through_the_cache(tmp_path):
+    stub = StubLLM(responder=flaky_responder(1))
+    llm_client = CachedLLM(stub, ResponseCache(str(tmp_path / "cache.sqlite3")))
+    posts = [f"Post {i} about hiring and careers" for i in range(4)]
+
+    results = extract_metadata_batches(posts, llm_client)
+    assert stub.calls == 2  # the identical retry prompt was not answered from the cache
+    assert all(metadata["tags"] == ["Job Search"] for metadata in results)
+
+    # The bad answer was dropped, the good one is reused
+    assert extract_metadata_batches(posts, llm_client) == results
+    assert stub.calls == 2
+
+
+def test_batch_retry_resends_only_failed_posts():
+    prompts = []
+
+    def respond(prompt):
+        prompts.append(prompt)
+        if len(prompts) == 1:
+            return '[{"id": 1, "tags": ["Hiring"]}, {"id": 2, "tags": "not a list"}, {"id": 3, "tags": ["Growth"]}]'
+        return default_responder(prompt)
+
+    sizer = AdaptiveBatchSize(8)
+    results = extract_metadata_batches(
+        ["First post about hiring", "Second post about careers", "Third post about growth", "Fourth post"],
+        StubLLM(responder=respond), sizer,
+    )
+    assert [metadata["tags"] for metadata in results] == [["Hiring"], ["Job Search"], ["Growth"], ["Job Search"]]
+    assert len(prompts) == 2
+    assert "Second post" in prompts[1] and "Fourth post" in prompts[1] and "First post" not in prompts[1]
+    assert sizer.failure_rate > 0
+
+
+def test_batch_gives_up_after_max_retries():
+    stub = StubLLM(responder=lambda prompt: "garbage")
+
+    results = extract_metadata_batches(["One post about work", "Another post about work"], stub)
+    assert results == [{}, {}]
+    assert stub.calls == MAX_RETRIES + 1
+
+
+def test_parse_batch_response_array():
+    response = '[{"id": 1, "tags": ["A"]}, {"id": "2", "tags": ["B", "C", "D"]}]'
+    assert parse_batch_response(response) == {"1": ["A"], "2": ["B", "C"]}
+
+
+def test_parse_batch_response_wrapped_object():
+    assert parse_batch_response('{"posts": [{"id": 1, "tags": ["A"]}]}') == {"1": ["A"]}
+
+
+def test_parse_batch_response_keyed_object():
+    assert parse_batch_response('{"1": ["A"], "2": ["B"]}') == {"1": ["A"], "2": ["B"]}
+
+
+def test_parse_batch_response_skips_malformed_item():
+    response = 'Here you go: [{"id": 1, "tags": ["A"]}, {"id": 2, "tags": ["B" "C"]}, {"id": 3, "tags": ["X"]}]'
+    assert parse_batch_response(response) == {"1": ["A"], "3": ["X"]}
+
+
+def test_parse_batch_response_without_json():
+    assert parse_batch_response("no json here") == {}
+
+
+def test_report_counts_posts_with_metadata_and_failed_posts(tmp_path):
+    raw_path = tmp_path / "raw.json"
+    write_raw_posts(raw_path)
+
+    broken = StubLLM(responder=lambda prompt: "not json")
+    report = process_post(str(raw_path), str(tmp_path / "failed.json"), llm_client=broken,
+                          requests_per_minute=1e9, dedup_threshold=0, incremental=False)
+    summary = report.summary()
+    assert (summary["items"], summary["failures"]) == (0, 10)
+    assert summary["items_per_sec"] == 0
+
+    report = process_post(str(raw_path), str(tmp_path / "ok.json"), llm_client=StubLLM(),
+                          requests_per_minute=1e9, dedup_threshold=0, incremental=False)
+    summary = report.summary()
+    assert (summary["items"], summary["failures"]) == (10, 0)
@@ -0,0 +1,175 @@
+import threading
+import time
+
+from stub_llm import StubLLM
+from warm_pool import SingleFlight, WarmPool
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.01)
+
+
+def run_concurrently(target, count):
+    results = [None] * count
+
+    def run(i):
+        results[i] = target()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_calls_share_one_result():
+    flights = SingleFlight()
+    stub = StubLLM(latency=0.2)
+
+    results = run_concurrently(lambda: flights.do("key", lambda: stub.invoke("hello").content), 5)
+    assert stub.calls == 1
+    assert len(set(results)) == 1
+
+
+def test_calls_after_completion_run_again():
+    flights = SingleFlight()
+    stub = StubLLM()
+
+    flights.do("key", lambda: stub.invoke("hello"))
+    flights.do("key", lambda: stub.invoke("hello"))
+    assert stub.calls == 2
+
+
+def test_concurrent_streams_share_one_call():
+    flights = SingleFlight()
+    stub = StubLLM(latency=0.2, token_latency=0.001)
+
+    def make_stream(stats):
+        stats["source"] = "shared"
+        for chunk in stub.stream("hello"):
+            yield chunk.content
+
+    def follow():
+        stats = {}
+        return "".join(flights.stream("key", make_stream, stats)), stats
+
+    results = run_concurrently(follow, 4)
+    assert stub.calls == 1
+    assert len({text for text, _ in results}) == 1
+    assert all(stats == {"source": "shared"} for _, stats in results)
+
+
+def test_stream_keeps_running_when_first_follower_stops():
+    flights = SingleFlight()
+    stub = StubLLM(latency=0.1, token_latency=0.005)
+
+    def make_stream(stats):
+        for chunk in stub.stream("hello"):
+            yield chunk.content
+
+    first = flights.stream("key", make_stream)
+    next(first)
+    first.close()
+    text = "".join(flights.stream("key", make_stream))
+    assert stub.calls == 1
+    assert text == stub.responder("hello")
+
+
+def test_stream_error_reaches_every_follower():
+    flights = SingleFlight()
+
+    def make_stream(stats):
+        time.sleep(0.1)
+        yield "partial"
+        raise ConnectionError("boom")
+
+    def follow():
+        try:
+            return "".join(flights.stream("key", make_stream))
+        except ConnectionError as e:
+            return e
+
+    results = run_concurrently(follow, 3)
+    assert all(isinstance(result, ConnectionError) for result in results)
+
+
+def counting_generator(delay=0.0):
+    calls = []
+    lock = threading.Lock()
+
+    def generate(key):
+        time.sleep(delay)
+        with lock:
+            calls.append(key)
+            return f"{key} variant {len(calls)}", {"total_time": delay}
+
+    return generate, calls
+
+
+def test_pool_refills_in_background_after_a_miss():
+    generate, calls = counting_generator()
+    pool = WarmPool(generate, size=2, max_keys=5, max_age=60)
+
+    assert pool.take("a") is None
+    wait_until(lambda: len(calls) == 2 and pool.filling["a"] == 0)
+    first, second = pool.take("a"), pool.take("a")
+    assert first is not None and second is not None
+    assert first[0] != second[0]  # variants are never served twice
+    wait_until(lambda: len(calls) == 4)
+
+
+def test_pool_never_exceeds_size_per_key():
+    generate, calls = counting_generator(delay=0.05)
+    pool = WarmPool(generate, size=2, max_keys=5, max_age=60)
+
+    for _ in range(5):
+        pool.take("a")
+    wait_until(lambda: pool.filling["a"] == 0)
+    assert len(calls) == 2
+    assert len(pool.entries["a"]) == 2
+
+
+def test_pool_evicts_variants_by_age():
+    generate, calls = counting_generator()
+    pool = WarmPool(generate, size=1, max_keys=5, max_age=0.2)
+
+    pool.take("a")
+    wait_until(lambda: len(calls) == 1 and pool.filling["a"] == 0)
+    time.sleep(0.3)
+    assert pool.take("a") is None  # too old to serve
+    wait_until(lambda: len(calls) == 2 and pool.filling["a"] == 0)
+    assert pool.take("a") is not None
+
+
+def test_pool_skips_failed_generations():
+    pool = WarmPool(lambda key: None, size=1, max_keys=5, max_age=60)
+
+    pool.take("a")
+    wait_until(lambda: pool.filling["a"] == 0)
+    assert pool.take("a") is None
+
+
+def test_pool_only_fills_most_requested_keys():
+    generate, calls = counting_generator()
+    pool = WarmPool(generate, size=1, max_keys=1, max_age=60)
+
+    pool.take("hot")
+    pool.take("hot")
+    pool.take("cold")
+    wait_until(lambda: pool.filling["hot"] == 0)
+    assert "cold" not in calls
+    assert set(pool.entries) == {"hot"}
+
+
+def test_disabled_pool_never_generates():
+    generate, calls = counting_generator()
+    pool = WarmPool(generate, size=0)
+
+    assert pool.take("a") is None
+    time.sleep(0.05)
+    assert calls == []
@@ -0,0 +1,105 @@
+import functools
+import re
+import zlib
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+@functools.lru_cache(maxsize=4)
+def random_projection(n_features, dims, seed):
+    """Seeded random sign matrix, shared by vectorizers with the same config"""
+    rng = np.random.default_rng(seed)
+    projection = (rng.integers(0, 2, size=(n_features, dims)) * 2 - 1).astype(np.float32)
+    projection /= np.sqrt(dims)
+    projection.flags.writeable = False
+    return projection
+
+
+class HashedTfidfVectorizer:
+    """CPU-only text vectorizer: hashed TF-IDF randomly projected to a dense space.
+
+    Tokens are hashed into `n_features` buckets with crc32 (stable across
+    processes), weighted by sublinear TF and IDF, then projected with a
+    seeded random sign matrix to `dims` float32 columns and L2-normalised,
+    so cosine similarity is a plain dot product.
+    """
+
+    def __init__(self, n_features=2 ** 14, dims=128, seed=0):
+        self.n_features = n_features
+        self.dims = dims
+        self.seed = seed
+        self.idf = np.ones(n_features, dtype=np.float32)
+        self.projection = random_projection(n_features, dims, seed)
+        self._bucket_cache = {}
+
+    def get_state(self):
+        """Picklable parameters; the projection is rebuilt from the seed"""
+        return {"n_features": self.n_features, "dims": self.dims, "seed": self.seed, "idf": self.idf}
+
+    @classmethod
+    def from_state(cls, state):
+        vectorizer = cls(state["n_features"], state["dims"], state["seed"])
+        vectorizer.idf = state["idf"]
+        return vectorizer
+
+    def bucket(self, token):
+        bucket = self._bucket_cache.get(token)
+        if bucket is None:
+            bucket = zlib.crc32(token.encode("utf-8")) % self.n_features
+            self._bucket_cache[token] = bucket
+        return bucket
+
+    def token_counts(self, text):
+        """Hashed bucket ids and their counts for one text"""
+        buckets = [self.bucket(token) for token in TOKEN_RE.findall(text.lower())]
+        if not buckets:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        ids, counts = np.unique(np.array(buckets, dtype=np.int64), return_counts=True)
+        return ids, counts.astype(np.float32)
+
+    def fit(self, texts):
+        self.fit_transform(texts)
+        return self
+
+    def fit_transform(self, texts):
+        docs = [self.token_counts(text) for text in texts]
+        doc_freq = np.zeros(self.n_features, dtype=np.float32)
+        for ids, _ in docs:
+            doc_freq[ids] += 1
+        self.idf = (np.log((1 + len(docs)) / (1 + doc_freq)) + 1).astype(np.float32)
+        return self._project(docs)
+
+    def transform(self, texts):
+        return self._project([self.token_counts(text) for text in texts])
+
+    def _project(self, docs):
+        vectors = np.zeros((len(docs), self.dims), dtype=np.float32)
+        for row, (ids, counts) in enumerate(docs):
+            if len(ids):
+                weights = (1 + np.log(counts)) * self.idf[ids]
+                vectors[row] = weights @ self.projection[ids]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+
+def top_k_indices(scores, k):
+    """Indices of the k highest scores, best first.
+
+    `scores` is (n,) or (n, m) for a batch of m queries; the result is
+    (k,) or (k, m) respectively.
+    """
+    n = scores.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty((0,) + scores.shape[1:], dtype=np.int64)
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1, axis=0)[:k]
+    else:
+        candidates = np.broadcast_to(
+            np.arange(n).reshape((n,) + (1,) * (scores.ndim - 1)), scores.shape
+        ).copy()
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=0), axis=0, kind="stable")
+    return np.take_along_axis(candidates, order, axis=0)
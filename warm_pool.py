@@ -0,0 +1,186 @@
+"""Request coalescing and a pool of pre-generated post variants.
+
+`SingleFlight` runs identical concurrent requests once: the first caller
+starts the work and later callers with the same key share its result (or
+follow its stream) instead of making their own LLM call.
+
+`WarmPool` keeps a few fresh, never-served variants ready for the most
+requested combinations. Taking a variant schedules a background refill,
+and variants older than `max_age` are discarded rather than served.
+"""
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from metrics import inc
+
+# Variants kept ready per combination (0 disables the pool), how many of the most
+# requested combinations are kept warm, and how old (seconds) a variant may get
+WARM_POOL_SIZE = int(os.getenv("WARM_POOL_SIZE", "2"))
+WARM_POOL_KEYS = int(os.getenv("WARM_POOL_KEYS", "5"))
+WARM_POOL_MAX_AGE = float(os.getenv("WARM_POOL_MAX_AGE", "900"))
+WARM_POOL_WORKERS = int(os.getenv("WARM_POOL_WORKERS", "2"))
+
+
+class Flight:
+    """One in-progress stream that any number of callers can follow"""
+
+    def __init__(self):
+        self.parts = []
+        self.stats = {}
+        self.done = False
+        self.error = None
+        self.condition = threading.Condition()
+
+    def run(self, make_stream):
+        try:
+            for text in make_stream(self.stats):
+                with self.condition:
+                    self.parts.append(text)
+                    self.condition.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            with self.condition:
+                self.done = True
+                self.condition.notify_all()
+
+    def follow(self, stats=None):
+        """Yield the stream's text from the start; copy its stats when it ends.
+
+        An exception raised by the stream is re-raised in every follower.
+        """
+        seen = 0
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.done or len(self.parts) > seen)
+                parts = self.parts[seen:]
+                done = self.done
+            seen += len(parts)
+            yield from parts
+            if done:
+                break
+        if self.error is not None:
+            raise self.error
+        if stats is not None:
+            stats.update(self.stats)
+
+
+class SingleFlight:
+    """Coalesce identical in-flight calls and streams by key.
+
+    Streams run on a background thread, so a follower that stops reading
+    (or the one that started the stream) does not cut it short for others.
+    """
+
+    def __init__(self, max_workers=8):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.flights = {}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="single-flight")
+
+    def do(self, key, fn):
+        """Result of fn(), shared with any concurrent caller using the same key"""
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = self.calls[key] = Future()
+            else:
+                inc("coalesced_requests_total")
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+        return future.result()
+
+    def stream(self, key, make_stream, stats=None):
+        """Follow the stream for key, starting make_stream(stats) if none is running"""
+        with self.lock:
+            flight = self.flights.get(key)
+            if flight is None:
+                flight = self.flights[key] = Flight()
+                self.executor.submit(self._run, key, flight, make_stream)
+            else:
+                inc("coalesced_requests_total")
+        return flight.follow(stats)
+
+    def _run(self, key, flight, make_stream):
+        try:
+            flight.run(make_stream)
+        finally:
+            with self.lock:
+                if self.flights.get(key) is flight:
+                    del self.flights[key]
+
+
+class WarmPool:
+    """Pre-generated, unserved variants for the most requested keys.
+
+    `generate(key)` returns (text, stats) for a fresh variant, or None if
+    it failed. Each `take` counts a request for its key; the `max_keys`
+    most requested keys are refilled up to `size` variants in the
+    background, at most `max_workers` generations at a time.
+    """
+
+    def __init__(self, generate, size=WARM_POOL_SIZE, max_keys=WARM_POOL_KEYS,
+                 max_age=WARM_POOL_MAX_AGE, max_workers=WARM_POOL_WORKERS):
+        self.generate = generate
+        self.size = size
+        self.max_keys = max_keys
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.filling = Counter()
+        self.demand = Counter()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="warm-pool")
+
+    def take(self, key):
+        """(text, stats) of a ready variant for key, or None; refills in the background"""
+        if self.size <= 0:
+            return None
+        with self.lock:
+            self.demand[key] += 1
+            self._evict(key)
+            entries = self.entries.get(key)
+            entry = entries.popleft() if entries else None
+            self._schedule_refill(key)
+        inc("warm_pool_lookups_total", result="hit" if entry else "miss")
+        return entry[1:] if entry else None
+
+    def _evict(self, key):
+        entries = self.entries.get(key)
+        cutoff = time.monotonic() - self.max_age
+        while entries and entries[0][0] < cutoff:
+            entries.popleft()
+            inc("warm_pool_evictions_total")
+
+    def _schedule_refill(self, key):
+        hot = {hot_key for hot_key, _ in self.demand.most_common(self.max_keys)}
+        for cold_key in [cold_key for cold_key in self.entries if cold_key not in hot]:
+            del self.entries[cold_key]
+        if key not in hot:
+            return
+        missing = self.size - len(self.entries.get(key, ())) - self.filling[key]
+        for _ in range(max(missing, 0)):
+            self.filling[key] += 1
+            self.executor.submit(self._fill, key)
+
+    def _fill(self, key):
+        try:
+            variant = self.generate(key)
+        except Exception as e:
+            print(f"Error pre-generating variant: {e}")
+            variant = None
+        with self.lock:
+            self.filling[key] -= 1
+            if variant is not None:
+                self.entries.setdefault(key, deque()).append((time.monotonic(),) + tuple(variant))
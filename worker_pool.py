@@ -0,0 +1,211 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import inc, percentile
+
+TRANSIENT_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+TRANSIENT_ERROR_NAMES = ("RateLimit", "Timeout", "Connection", "InternalServer", "ServiceUnavailable")
+
+
+class TokenBucket:
+    """Thread-safe token bucket that limits calls to `rate` per second"""
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, requests_per_minute, capacity=None):
+        """Build a bucket from a provider quota expressed in requests per minute"""
+        return cls(requests_per_minute / 60.0, capacity)
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` tokens are available and consume them"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def is_transient_error(error):
+    """Return True for errors worth retrying (throttling, timeouts, server errors)"""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    if status_code in TRANSIENT_STATUS_CODES:
+        return True
+    return any(name in type(error).__name__ for name in TRANSIENT_ERROR_NAMES)
+
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=30.0):
+    """Exponential backoff with full jitter for the given retry attempt"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+class ThroughputReport:
+    """Collect per-item latencies and summarise throughput for a run"""
+
+    def __init__(self):
+        self.latencies = []
+        self.retries = 0
+        self.failures = 0
+        self.started = None
+        self.finished = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    def record(self, latency, items=1):
+        """Record a completed call that handled `items` items"""
+        with self.lock:
+            self.latencies.extend([latency] * items)
+
+    def record_retry(self):
+        with self.lock:
+            self.retries += 1
+
+    def record_failure(self, items=1):
+        with self.lock:
+            self.failures += items
+
+    def summary(self):
+        """Return throughput and latency figures as a dict"""
+        end = self.finished if self.finished is not None else time.perf_counter()
+        elapsed = end - self.started if self.started is not None else 0.0
+        items = len(self.latencies)
+        return {
+            "items": items,
+            "elapsed": elapsed,
+            "items_per_sec": items / elapsed if elapsed > 0 else 0.0,
+            "p50_latency": percentile(self.latencies, 50),
+            "p95_latency": percentile(self.latencies, 95),
+            "retries": self.retries,
+            "failures": self.failures,
+        }
+
+    def __str__(self):
+        s = self.summary()
+        return (
+            f"{s['items']} items in {s['elapsed']:.2f}s ({s['items_per_sec']:.2f}/s), "
+            f"p50 {s['p50_latency'] * 1000:.0f}ms, p95 {s['p95_latency'] * 1000:.0f}ms, "
+            f"{s['retries']} retries, {s['failures']} failures"
+        )
+
+
+class AdaptiveBatchSize:
+    """Batch size that halves when batched items fail and grows back by one while they succeed.
+
+    Decisions use a moving average of the per-item failure rate, reset
+    after each cut so one bad batch halves the size at most once.
+    """
+
+    def __init__(self, max_size, min_size=1, shrink_above=0.2, grow_below=0.05, smoothing=0.3):
+        self.max_size = max(1, int(max_size))
+        self.min_size = max(1, min(int(min_size), self.max_size))
+        self.size = self.max_size
+        self.shrink_above = shrink_above
+        self.grow_below = grow_below
+        self.smoothing = smoothing
+        self.failure_rate = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, items, failures):
+        if items <= 0:
+            return
+        with self.lock:
+            self.failure_rate += self.smoothing * (failures / items - self.failure_rate)
+            if self.failure_rate > self.shrink_above:
+                self.size = max(self.min_size, self.size // 2)
+                # Judge the new size on its own results
+                self.failure_rate = (self.shrink_above + self.grow_below) / 2
+            elif self.failure_rate < self.grow_below:
+                self.size = min(self.max_size, self.size + 1)
+
+
+def call_with_retry(func, item, rate_limiter=None, retries=3, base_delay=1.0, max_delay=30.0, report=None,
+                    weight=None):
+    """Call func(item), waiting on the rate limiter and retrying transient errors.
+
+    `weight(item, result)` is how many items the report counts for a call
+    (1 by default): successes for a result, failures when result is None
+    because the call failed for good.
+    """
+    attempt = 0
+    while True:
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        started = time.perf_counter()
+        try:
+            result = func(item)
+        except Exception as e:
+            if attempt >= retries or not is_transient_error(e):
+                inc("retry_failures_total")
+                if report is not None:
+                    report.record_failure(weight(item, None) if weight is not None else 1)
+                raise
+            inc("retries_total")
+            if report is not None:
+                report.record_retry()
+            time.sleep(backoff_delay(attempt, base_delay, max_delay))
+            attempt += 1
+            continue
+        if report is not None:
+            report.record(time.perf_counter() - started, weight(item, result) if weight is not None else 1)
+        return result
+
+
+def imap_ordered(func, items, max_workers=4, rate_limiter=None, retries=3, base_delay=1.0,
+                 max_delay=30.0, report=None, weight=None):
+    """Apply func to items on a thread pool, yielding results in input order.
+
+    At most `max_workers * 2` items are in flight, so `items` may be a lazy
+    iterator over a corpus that does not fit in memory.
+    """
+    max_workers = max(1, int(max_workers))
+    window = max_workers * 2
+    pending = deque()
+
+    def submit(executor, item):
+        return executor.submit(
+            call_with_retry, func, item,
+            rate_limiter=rate_limiter, retries=retries,
+            base_delay=base_delay, max_delay=max_delay, report=report, weight=weight,
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            for item in items:
+                pending.append(submit(executor, item))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def run_ordered(func, items, **kwargs):
+    """Eager version of imap_ordered returning a list"""
+    return list(imap_ordered(func, items, **kwargs))